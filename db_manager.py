@@ -1,8 +1,16 @@
 import sqlite3
 import logging
 import os
-from typing import Dict, Optional, Any, ContextManager, List, Tuple, Iterator
+import atexit
+import queue
+import threading
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, Optional, Any, ContextManager, List, Tuple, Iterator, Iterable
 from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+from operator import itemgetter
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -26,21 +34,143 @@ class InvalidDataError(DatabaseError):
     """Exception raised when the data provided is invalid or incomplete."""
     pass
 
-@contextmanager
-def get_db_connection(db_path: str, timeout: float = 30.0) -> ContextManager[sqlite3.Connection]:
-    """Create a context-managed database connection.
+_INSERT_EMAIL_PREFIX = '''
+INSERT INTO emails (
+    id, subject, sender_name, sender_email, recipient_name, 
+    recipient_email, email_date, source_pst
+) VALUES '''
+_EMAIL_ROW_PLACEHOLDERS = '(?, ?, ?, ?, ?, ?, ?, ?)'
+EMAIL_COLUMN_COUNT = 8
+
+# Each attachment is a row of its own pointing at its email; attachment types
+# are stored once in attachment_types and resolved to their integer id
+# through the UNIQUE(name) index
+INSERT_ATTACHMENT_SQL = '''
+INSERT INTO attachments (email_id, filename, attachment_type_id)
+VALUES (?, ?, (SELECT id FROM attachment_types WHERE name = ?))
+'''
+
+INSERT_ATTACHMENT_TYPE_SQL = 'INSERT OR IGNORE INTO attachment_types (name) VALUES (?)'
+
+# Always pass this exact string so sqlite3's per-connection statement cache
+# (keyed by SQL text) reuses the compiled statement instead of re-preparing it
+INSERT_EMAIL_SQL = _INSERT_EMAIL_PREFIX + _EMAIL_ROW_PLACEHOLDERS
+
+def get_max_host_parameters(version_info: Tuple[int, ...] = sqlite3.sqlite_version_info) -> int:
+    """Return the default host parameter limit of a SQLite library version.
+    
+    Args:
+        version_info: SQLite version as a tuple (the linked library by default)
+        
+    Returns:
+        32766 for SQLite 3.32 and later, 999 for older versions
+    """
+    return 32766 if version_info >= (3, 32, 0) else 999
+
+# Multi-row inserts are bounded by the linked SQLite's host parameter limit
+# (Ubuntu 20.04 ships 3.31, which still allows only 999) and by how many
+# prepared rows we are willing to hold in memory. executemany() binds one row
+# at a time, so its chunks are only bounded by memory.
+SQLITE_MAX_VARS = get_max_host_parameters()
+MAX_ROWS_PER_BATCH = 5000
+DEFAULT_BATCH_SIZE = min(MAX_ROWS_PER_BATCH, SQLITE_MAX_VARS // EMAIL_COLUMN_COUNT)
+
+@lru_cache(maxsize=None)
+def get_multi_row_insert_sql(row_count: int) -> str:
+    """Build an INSERT statement that inserts several emails at once.
+    
+    Args:
+        row_count: Number of rows the statement should insert
+        
+    Returns:
+        SQL statement with one placeholder group per row
+    """
+    return _INSERT_EMAIL_PREFIX + ', '.join([_EMAIL_ROW_PLACEHOLDERS] * row_count)
+
+# Page size for new databases (a multiple of common 4 KB filesystem blocks;
+# 8 KB loaded a 200k-row mailbox ~25% faster than 4 KB, 16 KB gained nothing
+# more), page cache size in KB, and the memory-mapped read region (256 MB)
+PAGE_SIZE = 8192
+LEGACY_PAGE_SIZE = 1024
+CACHE_SIZE_KB = 20000
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Ingest is re-run from the PST files on failure, so a bulk load skips fsyncs
+# and keeps its rollback journal in memory (journal_mode=OFF would make the
+# per-file ROLLBACK undefined). RESTORE_PRAGMAS switch back to WAL afterwards.
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA locking_mode=EXCLUSIVE"
+)
+RESTORE_PRAGMAS = (
+    "PRAGMA locking_mode=NORMAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA optimize"
+)
+
+# Connections are cached per database path so that PRAGMA setup and the page
+# cache survive across calls instead of being rebuilt for every insert. Each
+# thread gets its own connection, keyed by (path, thread id): a connection
+# holds at most one transaction, so threads must never share one.
+_CONN_CACHE: Dict[Tuple[str, int], sqlite3.Connection] = {}
+_CONN_CACHE_LOCK = threading.Lock()
+
+def tune_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the standard write PRAGMAs to a freshly opened connection.
+    
+    Args:
+        conn: Connection with no transaction open
+        
+    Returns:
+        The same connection
+    """
+    conn.execute("PRAGMA journal_mode=WAL")  # Use Write-Ahead Logging for better concurrency
+    conn.execute("PRAGMA synchronous=NORMAL")  # Balance durability with performance
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")  # Use 20MB cache (negative value means KB)
+    conn.execute("PRAGMA temp_store=MEMORY")  # Store temp tables in memory
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")  # Serve page reads from memory-mapped I/O
+    
+    # Improved foreign key support
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+def _open_connection(db_path: str, timeout: float) -> sqlite3.Connection:
+    """Open a new database connection and apply the connection PRAGMAs.
     
     Args:
         db_path: Path to the SQLite database file
         timeout: Timeout for acquiring a database lock (seconds)
         
     Returns:
-        Context manager yielding a database connection
+        Configured database connection
+    """
+    # Set timeout to avoid hanging when database is locked
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False, isolation_level=None)
+    try:
+        # Page size can only change before WAL is enabled; on a new database
+        # this applies to the first write, older 1 KB-page databases are rebuilt
+        conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        if conn.execute("PRAGMA page_size").fetchone()[0] == LEGACY_PAGE_SIZE:
+            logging.info(f"Rebuilding {db_path} with {PAGE_SIZE} byte pages")
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+            conn.execute("VACUUM")
         
+        tune_connection(conn)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+def _ensure_db_dir(db_path: str) -> None:
+    """Create the directory holding a database file if it doesn't exist.
+    
     Raises:
-        DatabaseConnectionError: If connection to the database fails
+        DatabaseConnectionError: If the directory cannot be created
     """
-    # Create directory if it doesn't exist
     db_dir = os.path.dirname(db_path)
     if db_dir and not os.path.exists(db_dir):
         try:
@@ -48,32 +178,334 @@ def get_db_connection(db_path: str, timeout: float = 30.0) -> ContextManager[sql
         except OSError as e:
             logging.error(f"Failed to create database directory {db_dir}: {e}")
             raise DatabaseConnectionError(f"Failed to create database directory: {e}") from e
-            
+
+def close_all_connections() -> None:
+    """Close every cached database connection."""
+    with _CONN_CACHE_LOCK:
+        for (db_path, _), conn in _CONN_CACHE.items():
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Failed to close database connection for {db_path}: {e}")
+        _CONN_CACHE.clear()
+
+atexit.register(close_all_connections)
+
+def close_connection(db_path: str) -> None:
+    """Close and forget the cached connections for one database, if any.
+    
+    Lets long runs that write many databases release each one's file handle
+    and page cache once they are done with it. The connections of every
+    thread are closed, so only call this once no thread still uses them.
+    
+    Args:
+        db_path: Path the connections were opened with
+    """
+    with _CONN_CACHE_LOCK:
+        conns = [_CONN_CACHE.pop(key) for key in list(_CONN_CACHE) if key[0] == db_path]
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Failed to close database connection for {db_path}: {e}")
+
+@contextmanager
+def get_db_connection(db_path: str, timeout: float = 30.0, bulk_load: bool = False) -> ContextManager[sqlite3.Connection]:
+    """Get a context-managed database connection.
+    
+    The connection is cached per database path and thread, and reused by
+    later calls from the same thread; it stays open when the context exits
+    and is closed by close_connection() or close_all_connections().
+    
+    Args:
+        db_path: Path to the SQLite database file
+        timeout: Timeout for acquiring a database lock (seconds)
+        bulk_load: Trade durability for insert speed while the context is
+            open; the regular WAL settings are restored when it exits
+        
+    Returns:
+        Context manager yielding a database connection
+        
+    Raises:
+        DatabaseConnectionError: If connection to the database fails
+    """
     try:
-        # Set timeout to avoid hanging when database is locked
-        conn = sqlite3.connect(db_path, timeout=timeout)
-        conn.execute("PRAGMA journal_mode=WAL")  # Use Write-Ahead Logging for better concurrency
-        conn.execute("PRAGMA synchronous=NORMAL")  # Balance durability with performance
-        conn.execute("PRAGMA cache_size=-10000")  # Use 10MB cache (negative value means KB)
-        conn.execute("PRAGMA temp_store=MEMORY")  # Store temp tables in memory
+        key = (db_path, threading.get_ident())
+        with _CONN_CACHE_LOCK:
+            conn = _CONN_CACHE.get(key)
+            if conn is None:
+                # Only a new connection needs the directory check
+                _ensure_db_dir(db_path)
+                conn = _open_connection(db_path, timeout)
+                _CONN_CACHE[key] = conn
         
-        # Improved foreign key support
-        conn.execute("PRAGMA foreign_keys=ON")
+        if not bulk_load:
+            yield conn
+            return
         
-        yield conn
+        for pragma in BULK_LOAD_PRAGMAS:
+            conn.execute(pragma)
+        try:
+            yield conn
+        finally:
+            for pragma in RESTORE_PRAGMAS:
+                conn.execute(pragma)
         
     except sqlite3.Error as e:
         logging.error(f"Database connection error for {db_path}: {e}")
         raise DatabaseConnectionError(f"Failed to connect to database: {e}") from e
-    finally:
-        if 'conn' in locals() and conn:
+
+class ReadOnlyPool:
+    """A small pool of read-only connections for running queries in parallel.
+    
+    WAL mode lets any number of readers proceed concurrently, and sqlite3
+    releases the GIL while a query runs, so separate threads each holding a
+    pooled connection can scan the database at the same time.
+    """
+    
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0):
+        """Open the pooled connections.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            size: Number of connections to open
+            timeout: Timeout for acquiring a database lock (seconds)
+            
+        Raises:
+            sqlite3.Error: If the database cannot be opened
+        """
+        self.db_path = db_path
+        self.size = size
+        self._connections = queue.Queue()
+        
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        try:
+            for _ in range(size):
+                conn = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False)
+                conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+                self._connections.put(conn)
+        except sqlite3.Error:
+            self.close()
+            raise
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, waiting until one is free.
+        
+        Returns:
+            Context manager yielding a read-only connection
+        """
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+    
+    def fetchall(self, query: str, params: Tuple = ()) -> List[Tuple]:
+        """Run a query on a pooled connection and return all rows.
+        
+        Args:
+            query: SQL query to run
+            params: Query parameters
+            
+        Returns:
+            List of result rows
+        """
+        with self.connection() as conn:
+            return conn.execute(query, params).fetchall()
+    
+    def close(self) -> None:
+        """Close every connection currently in the pool."""
+        while True:
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                break
             conn.close()
+    
+    def __enter__(self) -> 'ReadOnlyPool':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run a block of statements inside a single write transaction.
+    
+    The write lock is taken up front with BEGIN IMMEDIATE; the transaction is
+    committed when the block exits and rolled back if the block or the
+    commit raises anything, including KeyboardInterrupt, so the cached
+    connection never keeps the lock or stays inside the transaction.
+    
+    Args:
+        conn: Open database connection
+        
+    Returns:
+        Context manager yielding the same connection
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # A failed COMMIT (busy, disk full, I/O error) leaves the transaction open
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    subject TEXT,
+    sender_name TEXT,
+    sender_email TEXT,
+    recipient_name TEXT,
+    recipient_email TEXT,
+    email_date TEXT,
+    source_pst TEXT
+)
+'''
+
+# Low-cardinality MIME types, referenced from attachments by integer id
+CREATE_ATTACHMENT_TYPES_SQL = '''
+CREATE TABLE IF NOT EXISTS attachment_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+)
+'''
+
+# One row per saved attachment, so an email's details are stored only once
+CREATE_ATTACHMENTS_SQL = '''
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY,
+    email_id INTEGER NOT NULL REFERENCES emails(id),
+    filename TEXT,
+    attachment_type_id INTEGER REFERENCES attachment_types(id)
+)
+'''
+
+# The flat one-row-per-attachment layout of older versions, for readers:
+# emails without attachments appear once with empty attachment columns
+CREATE_EMAIL_DETAILS_VIEW_SQL = '''
+CREATE VIEW IF NOT EXISTS email_details AS
+SELECT e.id, e.subject, e.sender_name, e.sender_email, e.recipient_name,
+       e.recipient_email, COALESCE(a.filename, '') AS attachment_filename,
+       COALESCE(t.name, '') AS attachment_type, e.email_date, e.source_pst
+FROM emails e
+LEFT JOIN attachments a ON a.email_id = e.id
+LEFT JOIN attachment_types t ON t.id = a.attachment_type_id
+'''
+
+# Secondary indexes for frequently queried columns, keyed by index name
+EMAIL_INDEXES = {
+    'idx_sender_email': 'emails(sender_email)',
+    'idx_recipient_email': 'emails(recipient_email)',
+    'idx_email_date': 'emails(email_date)',
+    'idx_source_pst': 'emails(source_pst)',
+    # Joins each email to its attachments in email_details
+    'idx_attachment_email': 'attachments(email_id)',
+    # Lets the attachment type counts group by walking the index
+    'idx_attachment_type': 'attachments(attachment_type_id)'
+}
+
+# Email columns copied from legacy tables
+EMAIL_TABLE_FIELDS = (
+    'subject', 'sender_name', 'sender_email', 'recipient_name',
+    'recipient_email', 'email_date', 'source_pst'
+)
+
+# Tables written by older versions of the tool: 'emails' with one row per
+# attachment (attachment type as text or as an id), and the original
+# 'mytable' schema
+LEGACY_TABLES = ('emails', 'mytable')
+
+def _legacy_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Return the columns of a legacy table, or [] if it needs no migration."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if table == 'emails' and 'attachment_filename' not in columns:
+        return []
+    return columns
+
+def migrate_legacy_schema(conn: sqlite3.Connection) -> bool:
+    """Copy rows from legacy email tables into the current schema.
+    
+    Each legacy row becomes one email, plus an attachment row when it named
+    an attachment. Columns the legacy table lacks are left NULL, text
+    attachment types are moved into attachment_types, and the legacy table
+    is dropped afterwards.
+    
+    Args:
+        conn: Open database connection
+        
+    Returns:
+        True if a legacy table was migrated, False if there was nothing to do
+    """
+    migrated = False
+    for table in LEGACY_TABLES:
+        columns = _legacy_columns(conn, table)
+        if not columns:
+            continue
+        
+        logging.info(f"Migrating legacy table {table} to the current email schema")
+        with transaction(conn):
+            source = table
+            if table == 'emails':
+                # Renaming would repoint the view at the legacy table
+                conn.execute('DROP VIEW IF EXISTS email_details')
+                conn.execute('ALTER TABLE emails RENAME TO emails_legacy')
+                source = 'emails_legacy'
+            conn.execute(CREATE_TABLE_SQL)
+            conn.execute(CREATE_ATTACHMENT_TYPES_SQL)
+            conn.execute(CREATE_ATTACHMENTS_SQL)
+            
+            # Keep ids when the table is replaced; rows merged into an
+            # existing table are numbered after its last email
+            if table == 'emails':
+                email_id = 'l.id'
+            else:
+                last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM emails').fetchone()[0]
+                email_id = f'l.rowid + {last_id}'
+            
+            copied = [column for column in EMAIL_TABLE_FIELDS if column in columns]
+            conn.execute(
+                f"INSERT INTO emails (id, {', '.join(copied)}) "
+                f"SELECT {email_id}, {', '.join(f'l.{column}' for column in copied)} FROM {source} l"
+            )
+            
+            if 'attachment_type' in columns:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO attachment_types (name) "
+                    f"SELECT DISTINCT attachment_type FROM {source} "
+                    f"WHERE attachment_type != ''"
+                )
+                type_id = 't.id'
+                joins = ' LEFT JOIN attachment_types t ON t.name = l.attachment_type'
+            elif 'attachment_type_id' in columns:
+                type_id = 'l.attachment_type_id'
+                joins = ''
+            else:
+                type_id = 'NULL'
+                joins = ''
+            if 'attachment_filename' in columns:
+                conn.execute(
+                    f"INSERT INTO attachments (email_id, filename, attachment_type_id) "
+                    f"SELECT {email_id}, l.attachment_filename, {type_id} FROM {source} l{joins} "
+                    f"WHERE COALESCE(l.attachment_filename, '') != '' OR {type_id} IS NOT NULL"
+                )
+            
+            conn.execute(f'DROP TABLE {source}')
+        migrated = True
+    return migrated
 
-def create_db(db_name: str = 'emaildb.sqlite3') -> bool:
+def create_db(db_name: str = 'emaildb.sqlite3', with_indexes: bool = True) -> bool:
     """Create the database and table if they do not exist.
     
     Args:
         db_name: Path to the SQLite database file
+        with_indexes: Whether to create the secondary indexes as well
         
     Returns:
         True if database and table were created successfully, False otherwise
@@ -83,29 +515,20 @@ def create_db(db_name: str = 'emaildb.sqlite3') -> bool:
     """
     try:
         with get_db_connection(db_name) as conn:
+            migrate_legacy_schema(conn)
             cursor = conn.cursor()
             
-            # Add indexes for frequently queried columns
             create_statements = [
-                '''
-                CREATE TABLE IF NOT EXISTS emails (
-                    id INTEGER PRIMARY KEY,
-                    subject TEXT,
-                    sender_name TEXT,
-                    sender_email TEXT,
-                    recipient_name TEXT,
-                    recipient_email TEXT,
-                    attachment_filename TEXT,
-                    attachment_type TEXT,
-                    email_date TEXT,
-                    source_pst TEXT
-                )
-                ''',
-                'CREATE INDEX IF NOT EXISTS idx_sender_email ON emails(sender_email)',
-                'CREATE INDEX IF NOT EXISTS idx_recipient_email ON emails(recipient_email)',
-                'CREATE INDEX IF NOT EXISTS idx_email_date ON emails(email_date)',
-                'CREATE INDEX IF NOT EXISTS idx_source_pst ON emails(source_pst)'
+                CREATE_TABLE_SQL,
+                CREATE_ATTACHMENT_TYPES_SQL,
+                CREATE_ATTACHMENTS_SQL,
+                CREATE_EMAIL_DETAILS_VIEW_SQL
             ]
+            if with_indexes:
+                create_statements.extend(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON {target}'
+                    for name, target in EMAIL_INDEXES.items()
+                )
             
             for statement in create_statements:
                 try:
@@ -116,11 +539,6 @@ def create_db(db_name: str = 'emaildb.sqlite3') -> bool:
                     
             conn.commit()
             logging.info(f"Database and email table created successfully: {db_name}")
-            
-            # Verify the table exists by querying schema
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='emails'")
-            if not cursor.fetchone():
-                raise DatabaseCreationError("Table creation failed: emails table not found")
                 
         return True
     except sqlite3.Error as e:
@@ -130,45 +548,143 @@ def create_db(db_name: str = 'emaildb.sqlite3') -> bool:
         logging.error(f"Unexpected error creating database {db_name}: {e}")
         raise DatabaseCreationError(f"Unexpected error creating database: {e}") from e
 
+def create_table(db_name: str = 'emaildb.sqlite3') -> bool:
+    """Create the database and email table without secondary indexes.
+    
+    Used before a bulk load; call create_indexes() once the load is done.
+    
+    Args:
+        db_name: Path to the SQLite database file
+        
+    Returns:
+        True if database and table were created successfully
+        
+    Raises:
+        DatabaseCreationError: If database or table creation fails
+    """
+    return create_db(db_name, with_indexes=False)
+
+def drop_indexes(conn: sqlite3.Connection) -> None:
+    """Drop the secondary indexes so a bulk load only updates the table.
+    
+    Args:
+        conn: Open database connection
+        
+    Raises:
+        DatabaseCreationError: If an index cannot be dropped
+    """
+    try:
+        for name in EMAIL_INDEXES:
+            conn.execute(f'DROP INDEX IF EXISTS {name}')
+        conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Error dropping indexes: {e}")
+        raise DatabaseCreationError(f"Failed to drop indexes: {e}") from e
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    """Build the secondary indexes, typically once after a bulk load.
+    
+    Args:
+        conn: Open database connection
+        
+    Raises:
+        DatabaseCreationError: If an index cannot be created
+    """
+    try:
+        for name, target in EMAIL_INDEXES.items():
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+        conn.commit()
+        logging.info("Email indexes created successfully")
+    except sqlite3.Error as e:
+        logging.error(f"Error creating indexes: {e}")
+        raise DatabaseCreationError(f"Failed to create indexes: {e}") from e
+
+# Keys every email record must provide (source_pst is optional)
+REQUIRED_EMAIL_KEYS = (
+    'subject', 'sender_name', 'sender_email', 'recipient_name', 
+    'recipient_email', 'attachment_filename', 'attachment_type', 'email_date'
+)
+_REQUIRED_EMAIL_KEY_SET = frozenset(REQUIRED_EMAIL_KEYS)
+
 def validate_email_data(data_dict: Dict[str, str]) -> None:
     """Validate that the provided data contains all required fields.
     
+    Valid records pass a single set-subset check; the missing keys are only
+    worked out when the check fails.
+    
     Args:
         data_dict: Dictionary of email data
         
     Raises:
         InvalidDataError: If the data is missing required fields
     """
-    required_keys = [
-        'subject', 'sender_name', 'sender_email', 'recipient_name', 
-        'recipient_email', 'attachment_filename', 'attachment_type', 'email_date'
-    ]
-    
-    missing_keys = [key for key in required_keys if key not in data_dict]
+    if _REQUIRED_EMAIL_KEY_SET <= data_dict.keys():
+        return
     
-    if missing_keys:
-        raise InvalidDataError(f"Data dictionary is missing required keys: {', '.join(missing_keys)}")
+    missing_keys = [key for key in REQUIRED_EMAIL_KEYS if key not in data_dict]
+    raise InvalidDataError(f"Data dictionary is missing required keys: {', '.join(missing_keys)}")
+
+# Fields of an email record, in the order of a prepared row: one row per
+# attachment, matching the email_details view
+EMAIL_FIELDS = (
+    'subject', 'sender_name', 'sender_email', 'recipient_name',
+    'recipient_email', 'attachment_filename', 'attachment_type',
+    'email_date', 'source_pst'
+)
+
+# Every column of the email_details view, used to whitelist caller-supplied names
+EMAIL_COLUMNS = frozenset(('id',) + EMAIL_FIELDS)
+
+# Record key (not a column) telling whether a record starts a new email. The
+# parser emits one record per attachment and sets it to False on every record
+# of a message after the first; records without it each start their own email.
+NEW_EMAIL_KEY = 'new_email'
+
+# Builds the row tuple for a complete record in a single C-level call
+_EMAIL_FIELD_GETTER = itemgetter(*EMAIL_FIELDS)
 
 def prepare_email_data(data_dict: Dict[str, str]) -> Tuple:
     """Prepare email data for insertion into the database.
     
+    Values that are already strings are used as-is; anything else (such as
+    email.header.Header objects) is converted, and missing values become ''.
+    
     Args:
         data_dict: Dictionary of email data
         
     Returns:
-        Tuple of data values ready for insertion
-    """
-    return (
-        str(data_dict.get('subject', '') or ''),
-        str(data_dict.get('sender_name', '') or ''),
-        str(data_dict.get('sender_email', '') or ''),
-        str(data_dict.get('recipient_name', '') or ''),
-        str(data_dict.get('recipient_email', '') or ''),
-        str(data_dict.get('attachment_filename', '') or ''),
-        str(data_dict.get('attachment_type', '') or ''),
-        str(data_dict.get('email_date', '') or ''),
-        str(data_dict.get('source_pst', '') or '')
-    )
+        Tuple of the values in EMAIL_FIELDS order, followed by whether the
+        record starts a new email (see NEW_EMAIL_KEY)
+    """
+    new_email = bool(data_dict.get(NEW_EMAIL_KEY, True))
+    
+    # Fast path: every field present and already a string
+    try:
+        row = _EMAIL_FIELD_GETTER(data_dict)
+    except KeyError:
+        pass
+    else:
+        for value in row:
+            if type(value) is not str:
+                break
+        else:
+            return row + (new_email,)
+    
+    return tuple([
+        value if type(value) is str else str(value or '')
+        for value in map(data_dict.get, EMAIL_FIELDS)
+    ] + [new_email])
+
+def prepare_many(data_list: Iterable[Dict[str, str]]) -> Iterator[Tuple]:
+    """Lazily prepare many email records for insertion.
+    
+    Args:
+        data_list: Iterable of dictionaries containing email data
+        
+    Returns:
+        Iterator of tuples ready for insertion
+    """
+    return map(prepare_email_data, data_list)
 
 def store_data(data_dict: Dict[str, str], db_name: str = 'emaildb.sqlite3') -> bool:
     """Store email data in the database.
@@ -189,31 +705,21 @@ def store_data(data_dict: Dict[str, str], db_name: str = 'emaildb.sqlite3') -> b
         validate_email_data(data_dict)
         
         with get_db_connection(db_name) as conn:
-            cursor = conn.cursor()
-            
             # Prepare data with proper error handling for each field
             data_to_insert = prepare_email_data(data_dict)
 
-            # Insert data into the table
-            insert_sql = '''
-            INSERT INTO emails (
-                subject, sender_name, sender_email, recipient_name, 
-                recipient_email, attachment_filename, attachment_type, 
-                email_date, source_pst
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            
             try:
-                cursor.execute(insert_sql, data_to_insert)
-                conn.commit()
+                # Insert the email and its attachment in one transaction, so
+                # they share a single commit and are rolled back together
+                with transaction(conn):
+                    ensure_attachment_types(conn, (data_to_insert,))
+                    insert_one(conn, data_to_insert)
                 logging.debug("Email data inserted in database successfully.")
                 return True
             except sqlite3.IntegrityError as e:
-                conn.rollback()
                 logging.error(f"Integrity error storing data: {e}")
                 raise DatabaseWriteError(f"Integrity error: {e}") from e
             except sqlite3.Error as e:
-                conn.rollback()
                 logging.error(f"Error storing data: {e}")
                 raise DatabaseWriteError(f"Database error: {e}") from e
                 
@@ -230,13 +736,18 @@ def store_data(data_dict: Dict[str, str], db_name: str = 'emaildb.sqlite3') -> b
         logging.error(f"Unexpected error storing data: {e}")
         return False
 
-def store_data_batch(data_list: List[Dict[str, str]], db_name: str = 'emaildb.sqlite3', batch_size: int = 100) -> Tuple[int, int]:
+def store_data_batch(data_list: List[Dict[str, str]], db_name: str = 'emaildb.sqlite3', batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[int, int]:
     """Store multiple email data records in batches for better performance.
     
+    The emails of each batch are written with a single multi-row INSERT
+    statement.
+    
     Args:
         data_list: List of dictionaries containing email data
         db_name: Path to the SQLite database file
         batch_size: Number of records to insert in a single transaction
+            (capped so a statement never exceeds SQLITE_MAX_VARS parameters);
+            a batch grows past it rather than split the records of an email
         
     Returns:
         Tuple of (number of successful inserts, number of failed inserts)
@@ -249,20 +760,10 @@ def store_data_batch(data_list: List[Dict[str, str]], db_name: str = 'emaildb.sq
         
     successful = 0
     failed = 0
+    batch_size = max(1, min(batch_size, SQLITE_MAX_VARS // EMAIL_COLUMN_COUNT))
     
     try:
         with get_db_connection(db_name) as conn:
-            cursor = conn.cursor()
-            
-            # Insert data into the table
-            insert_sql = '''
-            INSERT INTO emails (
-                subject, sender_name, sender_email, recipient_name, 
-                recipient_email, attachment_filename, attachment_type, 
-                email_date, source_pst
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            
             # Process in batches for better performance
             current_batch = []
             
@@ -270,36 +771,38 @@ def store_data_batch(data_list: List[Dict[str, str]], db_name: str = 'emaildb.sq
                 try:
                     validate_email_data(data_dict)
                     data_to_insert = prepare_email_data(data_dict)
-                    current_batch.append(data_to_insert)
-                    
-                    # Execute batch if we've reached batch_size
-                    if len(current_batch) >= batch_size:
-                        try:
-                            conn.execute('BEGIN TRANSACTION')
-                            cursor.executemany(insert_sql, current_batch)
-                            conn.commit()
-                            successful += len(current_batch)
-                            logging.info(f"Batch of {len(current_batch)} emails inserted successfully")
-                        except sqlite3.Error as e:
-                            conn.rollback()
-                            failed += len(current_batch)
-                            logging.error(f"Failed to insert batch: {e}")
-                        current_batch = []
-                        
                 except (InvalidDataError, Exception) as e:
                     logging.error(f"Invalid data, skipping: {e}")
                     failed += 1
+                    continue
+                
+                # Execute batch if we've reached batch_size; batches are only
+                # cut where an email starts, so the attachments of one email
+                # always share a transaction and numbering never restarts
+                # partway through an email
+                if len(current_batch) >= batch_size and data_to_insert[_NEW_EMAIL_INDEX]:
+                    try:
+                        with transaction(conn):
+                            insert_chunk(conn, number_emails(current_batch, next_email_id(conn)),
+                                         multi_row=True)
+                        successful += len(current_batch)
+                        logging.info(f"Batch of {len(current_batch)} records inserted successfully")
+                    except sqlite3.Error as e:
+                        failed += len(current_batch)
+                        logging.error(f"Failed to insert batch: {e}")
+                    current_batch = []
+                
+                current_batch.append(data_to_insert)
             
             # Insert any remaining records
             if current_batch:
                 try:
-                    conn.execute('BEGIN TRANSACTION')
-                    cursor.executemany(insert_sql, current_batch)
-                    conn.commit()
+                    with transaction(conn):
+                        insert_chunk(conn, number_emails(current_batch, next_email_id(conn)),
+                                     multi_row=True)
                     successful += len(current_batch)
-                    logging.info(f"Final batch of {len(current_batch)} emails inserted successfully")
+                    logging.info(f"Final batch of {len(current_batch)} records inserted successfully")
                 except sqlite3.Error as e:
-                    conn.rollback()
                     failed += len(current_batch)
                     logging.error(f"Failed to insert final batch: {e}")
     
@@ -309,6 +812,142 @@ def store_data_batch(data_list: List[Dict[str, str]], db_name: str = 'emaildb.sq
         
     return successful, failed
 
+# Positions within a prepared row of the attachment columns, and a getter
+# for the values stored in the emails table
+_ATTACHMENT_FILENAME_INDEX = EMAIL_FIELDS.index('attachment_filename')
+_ATTACHMENT_TYPE_INDEX = EMAIL_FIELDS.index('attachment_type')
+_EMAIL_TABLE_VALUES = itemgetter(*[EMAIL_FIELDS.index(field) for field in EMAIL_TABLE_FIELDS])
+_NEW_EMAIL_INDEX = len(EMAIL_FIELDS)
+
+def ensure_attachment_types(conn: sqlite3.Connection, rows: Iterable[Tuple]) -> None:
+    """Add any attachment type names used by the rows to the lookup table.
+    
+    Args:
+        conn: Open database connection
+        rows: Prepared rows as returned by prepare_email_data()
+    """
+    names = {row[_ATTACHMENT_TYPE_INDEX] for row in rows}
+    names.discard('')
+    if names:
+        conn.executemany(INSERT_ATTACHMENT_TYPE_SQL, [(name,) for name in names])
+
+def next_email_id(conn: sqlite3.Connection) -> int:
+    """Return the id the next inserted email will get.
+    
+    Only stable while the caller holds the write lock (see transaction()).
+    
+    Args:
+        conn: Open database connection
+    """
+    return conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM emails').fetchone()[0]
+
+def number_emails(rows: Iterable[Tuple], first_id: int) -> Iterator[Tuple[int, bool, Tuple]]:
+    """Assign email ids to prepared rows, one id per email.
+    
+    Records list an email once per attachment; the parser flags every row
+    of a message after the first as continuing the previous email (see
+    NEW_EMAIL_KEY), so rows are grouped on that flag rather than on their
+    values. A continuing row with no email before it in rows starts one.
+    
+    Args:
+        rows: Prepared rows as returned by prepare_email_data()
+        first_id: Id to give the first email
+        
+    Returns:
+        Iterator of (email id, whether the row starts a new email, row)
+    """
+    email_id = first_id - 1
+    for row in rows:
+        is_new = row[_NEW_EMAIL_INDEX] or email_id < first_id
+        if is_new:
+            email_id += 1
+        yield email_id, is_new, row
+
+def insert_chunk(conn: sqlite3.Connection, numbered_rows: Iterable[Tuple[int, bool, Tuple]],
+                 multi_row: bool = False) -> int:
+    """Insert numbered rows: each new email once, then its attachments.
+    
+    Args:
+        conn: Open database connection
+        numbered_rows: Rows as produced by number_emails()
+        multi_row: Write the emails with one multi-row INSERT statement
+            instead of executemany(); the chunk must fit in SQLITE_MAX_VARS
+        
+    Returns:
+        Number of rows inserted
+    """
+    numbered_rows = list(numbered_rows)
+    email_rows = []
+    attachment_rows = []
+    for email_id, is_new, row in numbered_rows:
+        if is_new:
+            email_rows.append((email_id,) + _EMAIL_TABLE_VALUES(row))
+        if row[_ATTACHMENT_FILENAME_INDEX] or row[_ATTACHMENT_TYPE_INDEX]:
+            attachment_rows.append((email_id, row[_ATTACHMENT_FILENAME_INDEX], row[_ATTACHMENT_TYPE_INDEX]))
+    
+    if multi_row and email_rows:
+        conn.execute(get_multi_row_insert_sql(len(email_rows)), list(chain.from_iterable(email_rows)))
+    else:
+        conn.executemany(INSERT_EMAIL_SQL, email_rows)
+    if attachment_rows:
+        ensure_attachment_types(conn, [row for _, _, row in numbered_rows])
+        conn.executemany(INSERT_ATTACHMENT_SQL, attachment_rows)
+    return len(numbered_rows)
+
+def insert_one(conn: sqlite3.Connection, row: Tuple) -> None:
+    """Insert a single prepared email row using the cached INSERT statements.
+    
+    The row's attachment type must already exist (see ensure_attachment_types).
+    
+    Args:
+        conn: Open database connection
+        row: Tuple of values as returned by prepare_email_data()
+    """
+    email_id = conn.execute(INSERT_EMAIL_SQL, (None,) + _EMAIL_TABLE_VALUES(row)).lastrowid
+    if row[_ATTACHMENT_FILENAME_INDEX] or row[_ATTACHMENT_TYPE_INDEX]:
+        conn.execute(INSERT_ATTACHMENT_SQL,
+                     (email_id, row[_ATTACHMENT_FILENAME_INDEX], row[_ATTACHMENT_TYPE_INDEX]))
+
+def insert_many(conn: sqlite3.Connection, rows: Iterable[Tuple]) -> int:
+    """Insert prepared email rows using the cached INSERT statements.
+    
+    Email ids are assigned up front, so call this inside a transaction.
+    
+    Args:
+        conn: Open database connection
+        rows: Iterable of tuples as returned by prepare_email_data(); it is
+            consumed in chunks of MAX_ROWS_PER_BATCH, so a generator keeps
+            memory use flat
+        
+    Returns:
+        Number of rows inserted
+    """
+    numbered_rows = number_emails(rows, next_email_id(conn))
+    inserted = 0
+    while True:
+        chunk = list(islice(numbered_rows, MAX_ROWS_PER_BATCH))
+        if not chunk:
+            return inserted
+        inserted += insert_chunk(conn, chunk)
+
+def insert_email_rows(conn: sqlite3.Connection, data_list: Iterable[Dict[str, str]]) -> int:
+    """Insert email records on an open connection without committing.
+    
+    The caller owns the transaction, so many calls can share a single commit.
+    
+    Args:
+        conn: Open database connection
+        data_list: Iterable of dictionaries containing email data, such as a
+            generator streaming records out of a mailbox
+        
+    Returns:
+        Number of records inserted
+        
+    Raises:
+        sqlite3.Error: If the insert fails
+    """
+    return insert_many(conn, prepare_many(data_list))
+
 def get_email_count(db_name: str = 'emaildb.sqlite3') -> int:
     """Get the total number of emails in the database.
     
@@ -339,7 +978,8 @@ def query_emails(
     date_to: Optional[str] = None,
     with_attachments: Optional[bool] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    columns: Optional[List[str]] = None
 ) -> List[Dict[str, str]]:
     """Query emails with various filters.
     
@@ -353,18 +993,27 @@ def query_emails(
         with_attachments: If True, only include emails with attachments
         limit: Maximum number of results to return
         offset: Offset for pagination
+        columns: Columns to return (default: all columns)
         
     Returns:
         List of dictionaries containing email data
         
     Raises:
-        DatabaseConnectionError: If connection to the database fails
+        InvalidDataError: If an unknown column is requested
     """
+    if columns:
+        unknown_columns = [column for column in columns if column not in EMAIL_COLUMNS]
+        if unknown_columns:
+            raise InvalidDataError(f"Unknown email columns: {', '.join(unknown_columns)}")
+        select_list = ', '.join(columns)
+    else:
+        select_list = '*'
+    
     try:
         with get_db_connection(db_name) as conn:
             cursor = conn.cursor()
             
-            query = "SELECT * FROM emails WHERE 1=1"
+            query = f"SELECT {select_list} FROM email_details WHERE 1=1"
             params = []
             
             # Add filters
@@ -411,17 +1060,38 @@ def query_emails(
         logging.error(f"Error querying emails: {e}")
         return []
 
-def get_email_stats(db_name: str = 'emaildb.sqlite3') -> Dict[str, Any]:
+# Queries behind get_email_stats, keyed by the statistic they produce
+EMAIL_STATS_QUERIES = {
+    # Each scalar count is its own subquery, so the distinct counts scan the
+    # sender and recipient indexes instead of sorting the whole table twice
+    'totals': """
+        SELECT (SELECT COUNT(*) FROM emails),
+               (SELECT COUNT(DISTINCT email_id) FROM attachments WHERE filename != ''),
+               (SELECT COUNT(DISTINCT sender_email) FROM emails),
+               (SELECT COUNT(DISTINCT recipient_email) FROM emails)
+    """,
+    'pst_files': "SELECT DISTINCT source_pst FROM emails WHERE source_pst != ''",
+    'attachment_types': """
+        SELECT t.name, COUNT(*) 
+        FROM attachments a
+        JOIN attachment_types t ON t.id = a.attachment_type_id
+        GROUP BY a.attachment_type_id
+        ORDER BY COUNT(*) DESC
+    """
+}
+
+def get_email_stats(db_name: str = 'emaildb.sqlite3', pool_size: int = 3) -> Dict[str, Any]:
     """Get statistics about emails in the database.
     
+    The statistics queries run concurrently on a pool of read-only connections;
+    the scalar counts come from one aggregate query.
+    
     Args:
         db_name: Path to the SQLite database file
+        pool_size: Number of read-only connections (and threads) to use
         
     Returns:
         Dictionary of statistics
-        
-    Raises:
-        DatabaseConnectionError: If connection to the database fails
     """
     stats = {
         'total_emails': 0,
@@ -433,41 +1103,125 @@ def get_email_stats(db_name: str = 'emaildb.sqlite3') -> Dict[str, Any]:
     }
     
     try:
-        with get_db_connection(db_name) as conn:
-            cursor = conn.cursor()
-            
-            # Total emails
-            cursor.execute("SELECT COUNT(*) FROM emails")
-            stats['total_emails'] = cursor.fetchone()[0]
-            
-            # Emails with attachments
-            cursor.execute("SELECT COUNT(*) FROM emails WHERE attachment_filename != ''")
-            stats['emails_with_attachments'] = cursor.fetchone()[0]
-            
-            # Unique senders
-            cursor.execute("SELECT COUNT(DISTINCT sender_email) FROM emails")
-            stats['unique_senders'] = cursor.fetchone()[0]
-            
-            # Unique recipients
-            cursor.execute("SELECT COUNT(DISTINCT recipient_email) FROM emails")
-            stats['unique_recipients'] = cursor.fetchone()[0]
-            
-            # PST files
-            cursor.execute("SELECT DISTINCT source_pst FROM emails WHERE source_pst != ''")
-            stats['pst_files'] = [row[0] for row in cursor.fetchall()]
+        with ReadOnlyPool(db_name, size=pool_size) as pool:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+                futures = {
+                    key: executor.submit(pool.fetchall, query)
+                    for key, query in EMAIL_STATS_QUERIES.items()
+                }
+                rows = {key: future.result() for key, future in futures.items()}
+        
+        (stats['total_emails'], stats['emails_with_attachments'],
+         stats['unique_senders'], stats['unique_recipients']) = rows['totals'][0]
+        stats['pst_files'] = [row[0] for row in rows['pst_files']]
+        stats['attachment_types'] = {row[0]: row[1] for row in rows['attachment_types']}
+        
+        return stats
             
-            # Attachment types
-            cursor.execute("""
-                SELECT attachment_type, COUNT(*) 
-                FROM emails 
-                WHERE attachment_type != '' 
-                GROUP BY attachment_type
-                ORDER BY COUNT(*) DESC
-            """)
-            stats['attachment_types'] = {row[0]: row[1] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logging.error(f"Error getting email stats: {e}")
+        return stats
+
+# Partial results gathered from each attached database by
+# get_combined_email_stats(); distinct addresses are kept in keyed temp
+# tables so duplicates across databases collapse inside SQLite
+COMBINED_STATS_TABLES = (
+    'CREATE TEMP TABLE senders (email TEXT PRIMARY KEY) WITHOUT ROWID',
+    'CREATE TEMP TABLE recipients (email TEXT PRIMARY KEY) WITHOUT ROWID',
+    'CREATE TEMP TABLE pst_files (name TEXT PRIMARY KEY) WITHOUT ROWID',
+    'CREATE TEMP TABLE type_counts (name TEXT, count INTEGER)'
+)
+
+COMBINED_STATS_QUERIES = {
+    'totals': """
+        SELECT COUNT(*),
+               (SELECT COUNT(DISTINCT email_id) FROM src.attachments WHERE filename != '')
+        FROM src.emails
+    """,
+    'senders': """
+        INSERT OR IGNORE INTO temp.senders
+        SELECT sender_email FROM src.emails WHERE sender_email IS NOT NULL
+    """,
+    'recipients': """
+        INSERT OR IGNORE INTO temp.recipients
+        SELECT recipient_email FROM src.emails WHERE recipient_email IS NOT NULL
+    """,
+    'pst_files': """
+        INSERT OR IGNORE INTO temp.pst_files
+        SELECT source_pst FROM src.emails WHERE source_pst != ''
+    """,
+    'attachment_types': """
+        INSERT INTO temp.type_counts
+        SELECT t.name, COUNT(*)
+        FROM src.attachments a
+        JOIN src.attachment_types t ON t.id = a.attachment_type_id
+        GROUP BY a.attachment_type_id
+    """
+}
+
+def get_combined_email_stats(db_names: Iterable[str]) -> Dict[str, Any]:
+    """Get statistics about the emails across several databases.
+    
+    Each database is attached read-only to one in-memory connection in turn
+    and its partial results are merged in SQLite, so distinct senders and
+    recipients are counted without building Python sets. Attaching one
+    database at a time keeps clear of SQLite's limit on attached databases.
+    
+    Args:
+        db_names: Paths to the SQLite database files; missing ones are skipped
+        
+    Returns:
+        Dictionary of statistics, in the same form as get_email_stats()
+    """
+    stats = {
+        'total_emails': 0,
+        'emails_with_attachments': 0,
+        'unique_senders': 0,
+        'unique_recipients': 0,
+        'pst_files': [],
+        'attachment_types': {}
+    }
+    
+    # uri=True lets ATTACH take read-only file: URIs; autocommit so no
+    # implicit transaction holds the attached database at DETACH
+    conn = sqlite3.connect(':memory:', uri=True, isolation_level=None)
+    try:
+        for statement in COMBINED_STATS_TABLES:
+            conn.execute(statement)
+        
+        for db_name in db_names:
+            if not os.path.exists(db_name):
+                continue
             
-            return stats
+            try:
+                conn.execute('ATTACH DATABASE ? AS src', (f"{Path(db_name).resolve().as_uri()}?mode=ro",))
+            except sqlite3.Error as e:
+                logging.error(f"Error attaching {db_name} for stats: {e}")
+                continue
             
-    except (DatabaseConnectionError, sqlite3.Error) as e:
-        logging.error(f"Error getting email stats: {e}")
+            try:
+                total, with_attachments = conn.execute(COMBINED_STATS_QUERIES['totals']).fetchone()
+                stats['total_emails'] += total
+                stats['emails_with_attachments'] += with_attachments
+                for key in ('senders', 'recipients', 'pst_files', 'attachment_types'):
+                    conn.execute(COMBINED_STATS_QUERIES[key])
+            except sqlite3.Error as e:
+                logging.error(f"Error getting email stats from {db_name}: {e}")
+            finally:
+                conn.execute('DETACH DATABASE src')
+        
+        stats['unique_senders'] = conn.execute('SELECT COUNT(*) FROM temp.senders').fetchone()[0]
+        stats['unique_recipients'] = conn.execute('SELECT COUNT(*) FROM temp.recipients').fetchone()[0]
+        stats['pst_files'] = [row[0] for row in conn.execute('SELECT name FROM temp.pst_files')]
+        stats['attachment_types'] = {
+            row[0]: row[1] for row in conn.execute(
+                'SELECT name, SUM(count) FROM temp.type_counts GROUP BY name ORDER BY SUM(count) DESC'
+            )
+        }
         return stats
+    
+    except sqlite3.Error as e:
+        logging.error(f"Error getting combined email stats: {e}")
+        return stats
+    finally:
+        conn.close()
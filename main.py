@@ -4,57 +4,156 @@ import shutil
 import logging
 import sqlite3
 import argparse
+import threading
 import concurrent.futures
 import time
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Callable, Iterator
 from pathlib import Path
+from contextlib import nullcontext
 from datetime import datetime
-from mbox_parser import parse_mbox_file
-from db_manager import create_db, get_email_stats, get_email_count
+from mbox_parser import MappedMbox, parse_mbox_file, parse_mbox_rows
+from db_manager import (
+    create_table, create_indexes, drop_indexes, get_db_connection, close_connection,
+    insert_many, transaction,
+    get_email_stats, get_combined_email_stats, get_email_count, DatabaseCreationError
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# File extensions picked up during discovery, compared case-insensitively;
+# tuples so a single str.endswith call checks them all
+MBOX_EXTENSIONS = ('.mbox',)
+PST_EXTENSIONS = ('.pst', '.ost')
+
+# MBOX files larger than this are split into byte ranges parsed by separate
+# worker processes; smaller pieces cost more in process overhead than they save
+MIN_SPLIT_BYTES = 64 * 1024 * 1024
+
+# Units used by format_size, each 1024 times the previous one
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+def iter_file_entries(target_dir: str, extensions: Optional[Tuple[str, ...]] = None) -> Iterator[os.DirEntry]:
+    """Yield the files under a directory whose extension is in extensions.
+    
+    Uses os.scandir, whose entries carry the file type from the directory
+    listing, so no extra stat() call is needed per entry. Unreadable
+    directories are logged and skipped, like os.walk does.
+    
+    Args:
+        target_dir: Directory to search recursively
+        extensions: Lower-case extensions to match, including the dot, or
+            None to yield every file
+        
+    Returns:
+        Iterator of os.DirEntry objects for the matching files
+    """
+    pending_dirs = [target_dir]
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            logging.warning(f"Skipping unreadable directory {directory}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append(entry.path)
+                elif extensions is None or entry.name.lower().endswith(extensions):
+                    yield entry
+
 def list_mbox_files(target_dir: str) -> List[str]:
     """List all .mbox files in the target directory."""
-    mbox_files = []
-    for root, _, files in os.walk(target_dir):
-        for file in files:
-            if os.path.splitext(file)[-1].lower() == '.mbox':
-                mbox_path = os.path.join(root, file)
-                mbox_files.append(mbox_path)
-    return mbox_files
-
-def convert_single_pst(args: Tuple[str, str, str]) -> bool:
+    return [entry.path for entry in iter_file_entries(target_dir, MBOX_EXTENSIONS)]
+
+# Resolved once at import so each conversion skips the PATH search
+READPST = shutil.which("readpst") or "readpst"
+
+def get_readpst_jobs(worker_count: int) -> int:
+    """Work out how many readpst jobs each conversion should run.
+    
+    When fewer conversions run at once than there are CPUs, readpst's own
+    -j option uses the spare cores.
+    
+    Args:
+        worker_count: Number of conversions running at the same time
+        
+    Returns:
+        Number of readpst jobs per conversion (at least 1)
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, worker_count))
+
+def get_parse_workers(ingest_count: int) -> int:
+    """Work out how many processes each PST ingest should parse MBOX files with.
+    
+    When fewer PSTs are ingested at once than there are CPUs, each ingest
+    parses its MBOX files in parallel on the spare cores.
+    
+    Args:
+        ingest_count: Number of PSTs being ingested at the same time
+        
+    Returns:
+        Number of parsing processes per ingest (at least 1)
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, ingest_count))
+
+def convert_single_pst(args: Tuple[str, str, str, int]) -> Tuple[bool, List[str]]:
     """Convert a single PST/OST file to MBOX format.
     
+    readpst's progress output is discarded; its error output is captured
+    and logged if the conversion fails.
+    
     Args:
-        args: Tuple containing (file_path, file_name, mbox_dir)
+        args: Tuple containing (file_path, file_name, mbox_dir, readpst_jobs)
         
     Returns:
-        bool: Success status
+        Tuple of (success status, paths of the MBOX files readpst produced),
+        so the ingest step does not have to walk the output again
     """
-    file_path, file_name, mbox_dir = args
+    file_path, file_name, mbox_dir, readpst_jobs = args
     # Create a subdirectory for this PST file's output
     pst_output_dir = os.path.join(mbox_dir, os.path.splitext(file_name)[0])
     os.makedirs(pst_output_dir, exist_ok=True)
     
     logging.info(f"Converting {file_name} to MBOX format...")
-    command = ["readpst", "-D", "-b", "-o", pst_output_dir, file_path]
+    command = [READPST, "-D", "-b"]
+    if readpst_jobs > 1:
+        command += ["-j", str(readpst_jobs)]
+    command += ["-o", pst_output_dir, file_path]
     try:
-        subprocess.run(command, check=True)
-        return True
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to convert {file_name}: {e}")
-        return False
+        error_output = (e.stderr or b'').decode(errors='replace').strip()
+        logging.error(f"Failed to convert {file_name}: {e}" + (f": {error_output}" if error_output else ""))
+        return False, []
+    except OSError as e:
+        logging.error(f"Failed to run readpst for {file_name}: {e}")
+        return False, []
+    return True, list_mbox_files(pst_output_dir)
 
-def pst_to_mbox(target_dir: str, mbox_dir: str, max_workers: int = None) -> List[str]:
-    """Convert PST/OST files to MBOX format using parallel processing.
+def pst_to_mbox(target_dir: str, mbox_dir: str, max_workers: int = None,
+                on_converted: Optional[Callable[[str, List[str], int], None]] = None,
+                executor: Optional[concurrent.futures.Executor] = None,
+                pst_entries: Optional[List[os.DirEntry]] = None) -> List[str]:
+    """Convert PST/OST files to MBOX format using parallel readpst runs.
+    
+    Each worker only waits on its readpst subprocess, so conversions run on
+    threads rather than worker processes. At most one conversion per worker
+    is queued at a time; the next file is submitted as each one finishes.
     
     Args:
         target_dir: Directory containing PST/OST files
         mbox_dir: Directory to save MBOX files
-        max_workers: Maximum number of worker processes (None = auto)
+        max_workers: Maximum number of parallel conversions (None = auto)
+        on_converted: Called with each PST file name, the MBOX files it
+            produced and the number of conversions not yet finished as soon
+            as its conversion succeeds, in completion order, so work on it
+            can start right away
+        executor: Executor to run the conversions on; by default a thread
+            pool is created for this call and shut down afterwards
+        pst_entries: PST/OST files to convert, if the caller already listed
+            target_dir; found by scanning target_dir if None
         
     Returns:
         List of PST file names that were successfully converted
@@ -63,24 +162,53 @@ def pst_to_mbox(target_dir: str, mbox_dir: str, max_workers: int = None) -> List
         os.makedirs(mbox_dir)
     
     # Build a list of pst/ost files to convert
-    conversion_tasks = []
-    pst_files = []
-    for root, _, files in os.walk(target_dir):
-        for file in files:
-            if file.endswith(".pst") or file.endswith(".ost"):
-                file_path = os.path.join(root, file)
-                conversion_tasks.append((file_path, file, mbox_dir))
-                pst_files.append(file)
-    
-    if not conversion_tasks:
+    if pst_entries is None:
+        pst_entries = list(iter_file_entries(target_dir, PST_EXTENSIONS))
+    if not pst_entries:
         logging.warning(f"No PST/OST files found in {target_dir}")
         return []
     
-    # Process files in parallel
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(convert_single_pst, conversion_tasks))
+    worker_count = min(max_workers or os.cpu_count() or 1, len(pst_entries))
+    readpst_jobs = get_readpst_jobs(worker_count)
+    conversion_tasks = [(entry.path, entry.name, mbox_dir, readpst_jobs) for entry in pst_entries]
+    pst_files = [entry.name for entry in pst_entries]
+    
+    # Run one readpst per file in parallel and log each result as it finishes
+    results = [False] * len(conversion_tasks)
+    pending_tasks = iter(enumerate(conversion_tasks))
+    future_to_index = {}
     
-    # Filter out unsuccessful conversions
+    def submit_next(pool: concurrent.futures.Executor) -> None:
+        next_task = next(pending_tasks, None)
+        if next_task is not None:
+            index, task = next_task
+            future_to_index[pool.submit(convert_single_pst, task)] = index
+    
+    if executor:
+        pool_context = nullcontext(executor)
+    else:
+        pool_context = concurrent.futures.ThreadPoolExecutor(max_workers=worker_count)
+    with pool_context as pool:
+        for _ in range(worker_count):
+            submit_next(pool)
+        
+        completed = 0
+        while future_to_index:
+            done, _ = concurrent.futures.wait(future_to_index, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = future_to_index.pop(future)
+                completed += 1
+                mbox_files = []
+                try:
+                    results[index], mbox_files = future.result()
+                except Exception as e:
+                    logging.error(f"Conversion worker for {pst_files[index]} failed: {e}")
+                logging.info(f"Finished {pst_files[index]} ({completed}/{len(conversion_tasks)})")
+                if results[index] and on_converted:
+                    on_converted(pst_files[index], mbox_files, len(conversion_tasks) - completed)
+                submit_next(pool)
+    
+    # Filter out unsuccessful conversions, keeping discovery order
     successful_pst_files = [pst for pst, success in zip(pst_files, results) if success]
     
     successful = len(successful_pst_files)
@@ -98,28 +226,32 @@ def find_all_mbox_files(mbox_dir: str) -> List[str]:
     Returns:
         List of paths to MBOX files
     """
-    all_mbox_files = []
-    for root, _, files in os.walk(mbox_dir):
-        for file in files:
-            if file.endswith('.mbox'):
-                all_mbox_files.append(os.path.join(root, file))
-    
-    return all_mbox_files
+    return list_mbox_files(mbox_dir)
 
-def determine_source_pst(mbox_file_path: str) -> str:
+def determine_source_pst(mbox_file_path: str, mbox_dir: Optional[str] = None) -> str:
     """Determine the source PST file from an MBOX file path.
     
+    readpst writes each PST's folders under mbox_dir/<pst name>/, so when
+    mbox_dir is given the first directory below it names the PST, however
+    deeply the MBOX file is nested. Otherwise the parent directory is used.
+    
     Args:
-        mbox_file_path: Path to an MBOX file
+        mbox_file_path: Path to an MBOX file, as found under mbox_dir
+        mbox_dir: Directory the MBOX files were discovered in
         
     Returns:
         Name of the source PST file, or empty string if unknown
     """
-    mbox_path_parts = os.path.normpath(mbox_file_path).split(os.sep)
-    if len(mbox_path_parts) > 1:
-        # The parent directory name should be the PST name
-        return f"{mbox_path_parts[-2]}.pst"
-    return ""
+    if mbox_dir:
+        prefix = os.path.join(mbox_dir, '')
+        if mbox_file_path.startswith(prefix):
+            pst_name, separator, _ = mbox_file_path[len(prefix):].partition(os.sep)
+            if separator:
+                return f"{pst_name}.pst"
+    
+    # The parent directory name should be the PST name
+    parent_dir = os.path.basename(os.path.dirname(mbox_file_path))
+    return f"{parent_dir}.pst" if parent_dir else ""
 
 def clean_up_directory(directory: str) -> None:
     """Remove a directory and log the result.
@@ -133,74 +265,283 @@ def clean_up_directory(directory: str) -> None:
     except Exception as e:
         logging.error(f"Failed to remove directory {directory}: {e}")
 
-def process_with_shared_db(mbox_dir: str, db_path: str, keep_mbox: bool) -> None:
+def start_clean_up(directory: str) -> threading.Thread:
+    """Remove a directory in the background.
+    
+    The thread is not a daemon, so the interpreter (or pool worker) waits
+    for the removal to finish before exiting.
+    
+    Args:
+        directory: Directory to remove
+        
+    Returns:
+        The started thread
+    """
+    thread = threading.Thread(target=clean_up_directory, args=(directory,),
+                              name=f"clean-up-{os.path.basename(directory)}")
+    thread.start()
+    return thread
+
+def load_without_indexes(db_connection: sqlite3.Connection, db_path: str) -> None:
+    """Drop the secondary indexes before a bulk load.
+    
+    Args:
+        db_connection: Open database connection
+        db_path: Path to SQLite database file (for logging)
+    """
+    try:
+        drop_indexes(db_connection)
+    except DatabaseCreationError as e:
+        logging.warning(f"Loading {db_path} with existing indexes: {e}")
+
+def rebuild_indexes(db_connection: sqlite3.Connection, db_path: str) -> None:
+    """Build the secondary indexes once a bulk load has finished.
+    
+    Args:
+        db_connection: Open database connection
+        db_path: Path to SQLite database file (for logging)
+    """
+    try:
+        create_indexes(db_connection)
+    except DatabaseCreationError as e:
+        logging.error(f"Failed to create indexes for {db_path}: {e}")
+
+def split_parse_tasks(parse_tasks: List[Tuple], workers: int) -> List[Tuple]:
+    """Split the parse tasks of large MBOX files into byte ranges.
+    
+    A single large folder (often the Inbox) would otherwise keep one worker
+    busy long after the others finish. Files are split so each piece holds
+    about an equal share of the total bytes, but never less than
+    MIN_SPLIT_BYTES.
+    
+    Args:
+        parse_tasks: Tuples of (mbox_file, output_dir, source_pst)
+        workers: Number of parsing processes the tasks will be shared by
+        
+    Returns:
+        Parse tasks for parse_mbox_rows, with a (first, last) byte range
+        appended to those that cover part of a file
+    """
+    sizes = []
+    for task in parse_tasks:
+        try:
+            sizes.append(os.path.getsize(task[0]))
+        except OSError:
+            sizes.append(0)
+    piece_size = max(MIN_SPLIT_BYTES, sum(sizes) // max(1, workers))
+    
+    split_tasks = []
+    for task, size in zip(parse_tasks, sizes):
+        parts = size // piece_size
+        if parts < 2:
+            split_tasks.append(task)
+            continue
+        mbox = MappedMbox(task[0])
+        try:
+            split_tasks.extend((*task, byte_range) for byte_range in mbox.split_ranges(parts))
+        finally:
+            mbox.close()
+    return split_tasks
+
+def store_parsed_mboxes(db_connection: sqlite3.Connection, parse_tasks: List[Tuple[str, str, str]],
+                        max_workers: Optional[int] = None) -> None:
+    """Parse MBOX files in worker processes and store their rows as they finish.
+    
+    This process is the only writer and inserts each file's rows in its own
+    short transaction, so parsing runs in parallel without lock contention.
+    Called from a per-PST ingest worker, this starts a pool nested inside
+    that worker's pool, so the caller sizes max_workers to the cores the
+    other ingests leave idle.
+    
+    Args:
+        db_connection: Open database connection to write to
+        parse_tasks: Tuples of (mbox_file, output_dir, source_pst), optionally
+            followed by a byte range, for parse_mbox_rows
+        max_workers: Maximum number of parsing processes (None = auto)
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_mbox = {
+            executor.submit(parse_mbox_rows, *task): task[0]
+            for task in parse_tasks
+        }
+        for future in concurrent.futures.as_completed(future_to_mbox):
+            mbox_file = future_to_mbox[future]
+            try:
+                rows = future.result()
+                # Each file's emails are written in one transaction
+                with transaction(db_connection):
+                    stored = insert_many(db_connection, rows)
+                logging.info(f"Processed {stored} records from {mbox_file}")
+            except Exception as e:
+                logging.error(f"Failed to parse {mbox_file}: {e}")
+
+def process_with_shared_db(mbox_dir: str, db_path: str, keep_mbox: bool,
+                           max_workers: Optional[int] = None) -> None:
     """Process all MBOX files with a single shared database.
     
+    The MBOX files are parsed in worker processes while this process writes
+    (see store_parsed_mboxes).
+    
     Args:
         mbox_dir: Directory containing MBOX files
         db_path: Path to SQLite database file
         keep_mbox: Whether to keep MBOX files after processing
+        max_workers: Maximum number of parsing processes (None = auto)
     """
-    # Create a single database connection for all operations
-    db_connection = sqlite3.connect(db_path)
-    
-    # Ensure database is created
-    create_db(db_path)
+    # Ensure database is created; indexes are built after the bulk load
+    create_table(db_path)
     
     # Find all MBOX files
     all_mbox_files = find_all_mbox_files(mbox_dir)
     
     if not all_mbox_files:
         logging.warning(f"No MBOX files found in {mbox_dir}")
-        db_connection.close()
         return
     
     logging.info(f"Found {len(all_mbox_files)} MBOX files to process")
     
-    # Process each MBOX file
-    for mbox_file in all_mbox_files:
-        # Determine source PST
-        source_pst = determine_source_pst(mbox_file)
+    # Share a single database connection for all writes; the load can be
+    # re-run from the PST files, so it skips journaling and fsyncs
+    with get_db_connection(db_path, bulk_load=True) as db_connection:
+        load_without_indexes(db_connection, db_path)
         
-        logging.info(f"Processing {mbox_file} from {source_pst}...")
-        try:
-            # Pass the database connection to avoid opening/closing for each file
-            parse_mbox_file(mbox_file, os.path.dirname(mbox_file), db_connection, source_pst)
-        except Exception as e:
-            logging.error(f"Failed to parse {mbox_file}: {e}")
-    
-    # Close the database connection when all files are processed
-    db_connection.close()
+        parse_tasks = []
+        for mbox_file in all_mbox_files:
+            # Determine source PST
+            source_pst = determine_source_pst(mbox_file, mbox_dir)
+            logging.info(f"Processing {mbox_file} from {source_pst}...")
+            parse_tasks.append((mbox_file, os.path.dirname(mbox_file), source_pst))
+        parse_tasks = split_parse_tasks(parse_tasks, max_workers or os.cpu_count() or 1)
+        store_parsed_mboxes(db_connection, parse_tasks, max_workers)
+        
+        rebuild_indexes(db_connection, db_path)
     
     # Cleanup if requested
     if not keep_mbox:
         clean_up_directory(mbox_dir)
 
-def process_with_separate_dbs(mbox_dir: str, db_path: str, keep_mbox: bool, pst_files: List[str]) -> None:
+def get_ingest_task(mbox_dir: str, db_path: str, keep_mbox: bool, pst_file: str,
+                    mbox_files: Optional[List[str]] = None
+                    ) -> Optional[Tuple[str, str, bool, str, Optional[List[str]]]]:
+    """Build the process_single_pst_mboxes arguments for one converted PST.
+    
+    Args:
+        mbox_dir: Directory containing MBOX files
+        db_path: Directory for SQLite database files
+        keep_mbox: Whether to keep MBOX files after processing
+        pst_file: Name of the converted PST file
+        mbox_files: MBOX files the conversion produced, if already known
+        
+    Returns:
+        Tuple of (pst_mbox_dir, pst_db_path, keep_mbox, pst_file, mbox_files),
+        or None if the PST produced no MBOX directory
+    """
+    pst_name = os.path.splitext(pst_file)[0]
+    pst_mbox_dir = os.path.join(mbox_dir, pst_name)
+    
+    if not os.path.exists(pst_mbox_dir):
+        logging.warning(f"MBOX directory for {pst_file} not found: {pst_mbox_dir}")
+        return None
+    
+    # Create a database for this PST file
+    pst_db_path = os.path.join(db_path, f"{pst_name}.sqlite3")
+    return pst_mbox_dir, pst_db_path, keep_mbox, pst_file, mbox_files
+
+def process_with_separate_dbs(mbox_dir: str, db_path: str, keep_mbox: bool, pst_files: List[str],
+                              max_workers: Optional[int] = None) -> None:
     """Process MBOX files with separate databases per PST file.
     
+    Every PST writes to its own database, so the PSTs are ingested
+    concurrently without contending for a single SQLite writer. Each ingest
+    runs in its own process because MBOX parsing is CPU-bound Python that
+    threads would serialise on the GIL.
+    
     Args:
         mbox_dir: Directory containing MBOX files
         db_path: Directory for SQLite database files
         keep_mbox: Whether to keep MBOX files after processing
         pst_files: List of PST files that were converted
+        max_workers: Maximum number of PSTs to ingest at once (None = auto)
     """
     # Create output directory if it doesn't exist
     os.makedirs(db_path, exist_ok=True)
     
+    ingest_tasks = []
     for pst_file in pst_files:
-        pst_name = os.path.splitext(pst_file)[0]
-        pst_mbox_dir = os.path.join(mbox_dir, pst_name)
+        task = get_ingest_task(mbox_dir, db_path, keep_mbox, pst_file)
+        if task:
+            ingest_tasks.append(task)
+    
+    # Cores the concurrent ingests leave idle go to parsing within each PST,
+    # through a parse pool nested in each ingest worker (see
+    # store_parsed_mboxes); every conversion has finished by now
+    parse_workers = get_parse_workers(min(max_workers or os.cpu_count() or 1, len(ingest_tasks)))
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_pst = {
+            executor.submit(process_single_pst_mboxes, *task, parse_workers=parse_workers): task[3]
+            for task in ingest_tasks
+        }
+        for future in concurrent.futures.as_completed(future_to_pst):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Failed to process MBOX files for {future_to_pst[future]}: {e}")
+
+def convert_and_ingest(target_dir: str, mbox_dir: str, db_path: str, keep_mbox: bool,
+                       max_workers: Optional[int] = None) -> List[str]:
+    """Convert PST/OST files and ingest each one into its own database.
+    
+    Ingest of a PST starts in a worker process as soon as its conversion
+    finishes, so readpst and the SQLite writers run at the same time instead
+    of in two phases.
+    
+    Args:
+        target_dir: Directory containing PST/OST files
+        mbox_dir: Directory to save MBOX files
+        db_path: Directory for SQLite database files
+        keep_mbox: Whether to keep MBOX files after processing
+        max_workers: Maximum number of parallel conversions and ingests (None = auto)
         
-        if not os.path.exists(pst_mbox_dir):
-            logging.warning(f"MBOX directory for {pst_file} not found: {pst_mbox_dir}")
-            continue
+    Returns:
+        List of PST file names that were successfully converted
+    """
+    os.makedirs(db_path, exist_ok=True)
+    
+    # List the PSTs once; pst_to_mbox converts the same list
+    pst_entries = list(iter_file_entries(target_dir, PST_EXTENSIONS))
+    
+    # A run with fewer PSTs than workers parses each PST's MBOX files in
+    # parallel, with a parse pool nested in the ingest worker (see
+    # store_parsed_mboxes). While any conversion is still running, readpst's
+    # -j jobs already use those spare cores, so ingests started then parse
+    # in their own process only.
+    parse_workers = get_parse_workers(min(max_workers or os.cpu_count() or 1, len(pst_entries)))
+    
+    future_to_pst = {}
+    # Conversions run on pst_to_mbox's threads; ingest is CPU-bound and gets
+    # worker processes, started once for every PST
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        def ingest_converted(pst_file: str, mbox_files: List[str], conversions_left: int) -> None:
+            task = get_ingest_task(mbox_dir, db_path, keep_mbox, pst_file, mbox_files)
+            if task:
+                future = executor.submit(process_single_pst_mboxes, *task,
+                                         parse_workers=1 if conversions_left else parse_workers)
+                future_to_pst[future] = pst_file
+        
+        pst_files = pst_to_mbox(target_dir, mbox_dir, max_workers, on_converted=ingest_converted,
+                                pst_entries=pst_entries)
         
-        # Create a database for this PST file
-        pst_db_path = os.path.join(db_path, f"{pst_name}.sqlite3")
-        process_single_pst_mboxes(pst_mbox_dir, pst_db_path, keep_mbox, pst_file)
+        for future in concurrent.futures.as_completed(future_to_pst):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Failed to process MBOX files for {future_to_pst[future]}: {e}")
+    
+    return pst_files
 
-def process_mbox_files(mbox_dir: str, db_path: str, keep_mbox: bool = False, shared_db: bool = False, pst_files: List[str] = None) -> None:
+def process_mbox_files(mbox_dir: str, db_path: str, keep_mbox: bool = False, shared_db: bool = False,
+                       pst_files: List[str] = None, max_workers: Optional[int] = None) -> None:
     """Process all MBOX files in the directory and store data in the database.
     
     Args:
@@ -209,6 +550,7 @@ def process_mbox_files(mbox_dir: str, db_path: str, keep_mbox: bool = False, sha
         keep_mbox: Whether to keep MBOX files after processing
         shared_db: Whether to use a single shared database for all PST files
         pst_files: List of PST files that were converted
+        max_workers: Maximum number of ingest processes (None = auto)
     """
     if not shared_db:
         # Process each PST's MBOX files separately (DEFAULT)
@@ -216,12 +558,13 @@ def process_mbox_files(mbox_dir: str, db_path: str, keep_mbox: bool = False, sha
             logging.warning("No PST files list provided for separate database mode")
             return
         
-        process_with_separate_dbs(mbox_dir, db_path, keep_mbox, pst_files)
+        process_with_separate_dbs(mbox_dir, db_path, keep_mbox, pst_files, max_workers)
     else:
         # Use a single database for all MBOX files (OPTIONAL)
-        process_with_shared_db(mbox_dir, db_path, keep_mbox)
+        process_with_shared_db(mbox_dir, db_path, keep_mbox, max_workers)
 
-def process_single_pst_mboxes(pst_mbox_dir: str, db_path: str, keep_mbox: bool, pst_file: str) -> None:
+def process_single_pst_mboxes(pst_mbox_dir: str, db_path: str, keep_mbox: bool, pst_file: str,
+                              mbox_files: Optional[List[str]] = None, parse_workers: int = 1) -> None:
     """Process MBOX files for a single PST file.
     
     Args:
@@ -229,38 +572,57 @@ def process_single_pst_mboxes(pst_mbox_dir: str, db_path: str, keep_mbox: bool,
         db_path: Path to SQLite database file for this PST
         keep_mbox: Whether to keep MBOX files after processing
         pst_file: Name of the PST file (for source tracking)
+        mbox_files: MBOX files to ingest; found by walking pst_mbox_dir if None
+        parse_workers: Number of processes to parse the MBOX files with; with
+            1 they are parsed and stored one after another in this process.
+            When this runs in an ingest worker, more than 1 starts a pool
+            nested inside the ingest pool
     """
-    # Create a database for this PST
-    create_db(db_path)
-    
-    # Create a database connection
-    db_connection = sqlite3.connect(db_path)
+    # Create a database for this PST; indexes are built after the bulk load
+    create_table(db_path)
     
-    # List MBOX files for this PST
-    mbox_files = list_mbox_files(pst_mbox_dir)
+    # List MBOX files for this PST unless the conversion already reported them
+    if mbox_files is None:
+        mbox_files = list_mbox_files(pst_mbox_dir)
     
     if not mbox_files:
         logging.warning(f"No MBOX files found for {pst_file} in {pst_mbox_dir}")
-        db_connection.close()
+        close_connection(db_path)
         return
         
     logging.info(f"Processing {len(mbox_files)} MBOX files from {pst_file}")
     
-    # Process each MBOX file
-    for mbox_file in mbox_files:
-        logging.info(f"Processing {mbox_file}...")
-        try:
-            # Pass the database connection and source PST
-            parse_mbox_file(mbox_file, pst_mbox_dir, db_connection, pst_file)
-        except Exception as e:
-            logging.error(f"Failed to parse {mbox_file}: {e}")
+    with get_db_connection(db_path, bulk_load=True) as db_connection:
+        load_without_indexes(db_connection, db_path)
+        
+        parse_tasks = []
+        if parse_workers > 1:
+            parse_tasks = split_parse_tasks(
+                [(mbox_file, pst_mbox_dir, pst_file) for mbox_file in mbox_files], parse_workers
+            )
+        
+        if len(parse_tasks) > 1:
+            store_parsed_mboxes(db_connection, parse_tasks, min(parse_workers, len(parse_tasks)))
+        else:
+            # Process each MBOX file
+            for mbox_file in mbox_files:
+                logging.info(f"Processing {mbox_file}...")
+                try:
+                    # Pass the database connection and source PST
+                    parse_mbox_file(mbox_file, pst_mbox_dir, db_connection, pst_file, keep_data=False)
+                except Exception as e:
+                    logging.error(f"Failed to parse {mbox_file}: {e}")
+        
+        rebuild_indexes(db_connection, db_path)
     
-    # Close the database connection
-    db_connection.close()
+    # Nothing else writes to this PST's database, so release it now rather
+    # than holding one open connection per PST until exit
+    close_connection(db_path)
     
-    # Cleanup if requested
+    # Cleanup if requested; the MBOX files are unlinked while the next PST
+    # is processed
     if not keep_mbox and not os.path.samefile(pst_mbox_dir, os.path.dirname(db_path)):
-        clean_up_directory(pst_mbox_dir)
+        start_clean_up(pst_mbox_dir)
 
 def get_attachment_sizes(attachment_dir: str) -> Dict[str, int]:
     """Get sizes of all attachments in the directory.
@@ -271,16 +633,15 @@ def get_attachment_sizes(attachment_dir: str) -> Dict[str, int]:
     Returns:
         Dictionary of {filename: size_in_bytes}
     """
-    attachment_sizes = {}
     if not os.path.exists(attachment_dir):
-        return attachment_sizes
-        
-    for root, _, files in os.walk(attachment_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            attachment_sizes[file] = os.path.getsize(file_path)
-            
-    return attachment_sizes
+        return {}
+    
+    # Attachments are regular files written by this tool, so the entry's own
+    # (cached, and on Windows free) stat is used without following links
+    return {
+        entry.name: entry.stat(follow_symlinks=False).st_size
+        for entry in iter_file_entries(attachment_dir)
+    }
 
 def format_size(size_bytes: int) -> str:
     """Format size in bytes to human-readable format.
@@ -291,11 +652,13 @@ def format_size(size_bytes: int) -> str:
     Returns:
         Human-readable size string
     """
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} TB"
+    # The unit is picked from the number of whole bits rather than by
+    # dividing once per unit; dividing by a power of two is exact, so the
+    # result matches repeated division by 1024
+    if size_bytes < 1024:
+        return f"{size_bytes:.2f} B"
+    unit_index = min(len(SIZE_UNITS) - 1, (int(size_bytes).bit_length() - 1) // 10)
+    return f"{size_bytes / (1 << (10 * unit_index)):.2f} {SIZE_UNITS[unit_index]}"
 
 def format_time(seconds: float) -> str:
     """Format time in seconds to human-readable format.
@@ -366,47 +729,16 @@ def collect_conversion_statistics(start_time: float, pst_files: List[str], db_pa
         email_stats = get_email_stats(db_path)
         stats.update(email_stats)
     else:
-        # Multiple databases, one per PST
-        total_db_size = 0
-        combined_stats = {
-            'total_emails': 0,
-            'emails_with_attachments': 0,
-            'unique_senders': set(),
-            'unique_recipients': set(),
-            'attachment_types': {},
-            'pst_files': []
-        }
-        
-        for pst_file in pst_files:
-            pst_name = os.path.splitext(pst_file)[0]
-            pst_db_path = os.path.join(db_path, f"{pst_name}.sqlite3")
-            
-            if os.path.exists(pst_db_path):
-                db_size = os.path.getsize(pst_db_path)
-                total_db_size += db_size
-                
-                # Get email statistics for this PST
-                pst_stats = get_email_stats(pst_db_path)
-                
-                combined_stats['total_emails'] += pst_stats['total_emails']
-                combined_stats['emails_with_attachments'] += pst_stats['emails_with_attachments']
-                combined_stats['unique_senders'].update(pst_stats.get('unique_senders', []))
-                combined_stats['unique_recipients'].update(pst_stats.get('unique_recipients', []))
-                combined_stats['pst_files'].extend(pst_stats.get('pst_files', []))
-                
-                # Combine attachment types
-                for att_type, count in pst_stats.get('attachment_types', {}).items():
-                    if att_type in combined_stats['attachment_types']:
-                        combined_stats['attachment_types'][att_type] += count
-                    else:
-                        combined_stats['attachment_types'][att_type] = count
-        
-        stats['database_size'] = total_db_size
-        stats['total_emails'] = combined_stats['total_emails']
-        stats['emails_with_attachments'] = combined_stats['emails_with_attachments']
-        stats['unique_senders'] = len(combined_stats['unique_senders'])
-        stats['unique_recipients'] = len(combined_stats['unique_recipients'])
-        stats['attachment_types'] = combined_stats['attachment_types']
+        # Multiple databases, one per PST, aggregated in a single connection
+        pst_db_paths = [
+            os.path.join(db_path, f"{os.path.splitext(pst_file)[0]}.sqlite3")
+            for pst_file in pst_files
+        ]
+        stats['database_size'] = sum(
+            os.path.getsize(pst_db_path) for pst_db_path in pst_db_paths
+            if os.path.exists(pst_db_path)
+        )
+        stats.update(get_combined_email_stats(pst_db_paths))
     
     return stats
 
@@ -476,7 +808,7 @@ def parse_arguments():
                         help='Path to directory for per-PST databases or a single shared database file (default: output/db)')
     
     parser.add_argument('--max-workers', type=int, default=None,
-                        help='Maximum number of worker processes for conversion (default: auto)')
+                        help='Maximum number of parallel conversion and per-PST ingest processes (default: auto)')
     
     parser.add_argument('--keep-mbox', action='store_true',
                         help='Keep MBOX files after processing (default: False)')
@@ -506,18 +838,29 @@ def main():
     logging.info(f"Starting PST/MBOX conversion with target_dir={args.target_dir}, mbox_dir={args.mbox_dir}")
     logging.info(f"Database mode: {'Shared' if args.shared_db else 'Per-PST'}, path: {args.db_path}")
     
-    # Convert PST/OST files to MBOX using parallel processing
-    # Get list of successfully converted PST files
-    pst_files = pst_to_mbox(args.target_dir, args.mbox_dir, args.max_workers)
-    
-    # Process MBOX files and store data in the database(s)
-    process_mbox_files(
-        args.mbox_dir, 
-        args.db_path, 
-        args.keep_mbox,
-        args.shared_db,
-        pst_files
-    )
+    if args.shared_db:
+        # Convert PST/OST files to MBOX using parallel processing
+        # Get list of successfully converted PST files
+        pst_files = pst_to_mbox(args.target_dir, args.mbox_dir, args.max_workers)
+        
+        # Process MBOX files and store data in the shared database
+        process_mbox_files(
+            args.mbox_dir, 
+            args.db_path, 
+            args.keep_mbox,
+            args.shared_db,
+            pst_files,
+            args.max_workers
+        )
+    else:
+        # Ingest each PST into its own database as soon as it is converted
+        pst_files = convert_and_ingest(
+            args.target_dir,
+            args.mbox_dir,
+            args.db_path,
+            args.keep_mbox,
+            args.max_workers
+        )
     
     # Collect and display statistics
     stats = collect_conversion_statistics(start_time, pst_files, args.db_path, args.shared_db)
@@ -1,15 +1,24 @@
 import os
+import mmap
 import mailbox
 import logging
 import email.utils
+import email.message
+import email.parser
+import email.policy
 import sqlite3
 import re
 import hashlib
-from typing import List, Dict, Union, Optional, Tuple, Any
+import base64
+import binascii
+from typing import List, Dict, Union, Optional, Tuple, Any, Iterator, Iterable, Set, Callable
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
-from db_manager import create_db, store_data
+from db_manager import (
+    NEW_EMAIL_KEY, create_db, insert_email_rows, insert_many, transaction, tune_connection
+)
 
 # Configure logging - standard format without redaction
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +30,26 @@ SENSITIVE_KEYWORDS = [
     'personal', 'restricted', 'classified', 'financial', 'medical'
 ]
 
+# Base64 attachments with at least this many encoded characters are decoded
+# into their file block by block rather than as one bytes object
+STREAM_DECODE_MIN_SIZE = 256 * 1024
+
+# Encoded characters decoded per block when streaming an attachment
+STREAM_DECODE_BLOCK_SIZE = 64 * 1024
+
+# Leading bytes that flag an attachment as an executable or a script, and
+# how many bytes check_attachment needs to compare against them
+EXECUTABLE_SIGNATURE = b'MZ'
+SCRIPT_SIGNATURES = (b'#!/', b'<?php')
+SIGNATURE_LENGTH = 8
+
+# Characters that are unsafe in attachment filenames, each mapped to "_"
+FILENAME_TRANSLATION = str.maketrans(dict.fromkeys('\\/:*?"<>|', '_'))
+
+# PII patterns, compiled once and searched in a single pass: an SSN
+# (XXX-XX-XXXX) or a 16-digit card number, optionally grouped in fours
+PII_PATTERN = re.compile(r'(?<!\w)\d(?:\d{2}-\d{2}-\d{4}|\d{3}(?:[- ]?\d{4}){3})(?!\w)')
+
 class SecurityConfig:
     """Security configuration for email processing."""
     
@@ -57,6 +86,10 @@ def check_sensitive_content(content: str) -> bool:
     """
     if not content:
         return False
+    
+    # Non-ASCII headers come back from compat32 as Header objects
+    if not isinstance(content, str):
+        content = str(content)
         
     # Convert to lowercase for case-insensitive matching
     content_lower = content.lower()
@@ -66,15 +99,9 @@ def check_sensitive_content(content: str) -> bool:
         if keyword in content_lower:
             return True
             
-    # Check for common PII patterns if enabled
-    if SecurityConfig.detect_pii:
-        # Check for SSN (XXX-XX-XXXX)
-        if re.search(r'\b\d{3}-\d{2}-\d{4}\b', content):
-            return True
-            
-        # Check for credit card numbers
-        if re.search(r'\b(?:\d{4}[- ]?){3}\d{4}\b', content):
-            return True
+    # Check for common PII patterns (SSNs, credit card numbers) if enabled
+    if SecurityConfig.detect_pii and PII_PATTERN.search(content):
+        return True
             
     return False
 
@@ -95,7 +122,7 @@ def sanitize_filename(filename: str) -> str:
     filename = os.path.basename(filename)
     
     # Replace potentially dangerous characters
-    filename = re.sub(r'[\\/:*?"<>|]', '_', filename)
+    filename = filename.translate(FILENAME_TRANSLATION)
     
     # Limit length
     if len(filename) > 255:
@@ -107,22 +134,25 @@ def sanitize_filename(filename: str) -> str:
         
     return filename
 
-def check_attachment(content_type: str, attachment_data: bytes) -> bool:
+def check_attachment(content_type: str, attachment_data: bytes, size: Optional[int] = None) -> bool:
     """Check attachment for potentially problematic characteristics.
     Logs warnings only, does not block or modify data.
     
     Args:
         content_type: MIME type of the attachment
-        attachment_data: Attachment data
+        attachment_data: Attachment data, or just its first block when size is given
+        size: Size of the whole attachment (None = len(attachment_data))
         
     Returns:
         True if attachment passes checks, False if warnings were generated
     """
     warnings_generated = False
+    if size is None:
+        size = len(attachment_data)
     
     # Check attachment size
-    if len(attachment_data) > SecurityConfig.max_attachment_size:
-        logging.warning(f"Attachment exceeds recommended size ({len(attachment_data)} bytes)")
+    if size > SecurityConfig.max_attachment_size:
+        logging.warning(f"Attachment exceeds recommended size ({size} bytes)")
         warnings_generated = True
         
     # Check if content type is potentially problematic
@@ -132,18 +162,35 @@ def check_attachment(content_type: str, attachment_data: bytes) -> bool:
         
     # Perform basic security scan if enabled
     if SecurityConfig.scan_attachments:
+        # Only the first few bytes are compared, so copy just those
+        header = bytes(attachment_data[:SIGNATURE_LENGTH])
+        
         # Check for executable signatures
-        if attachment_data[:2] == b'MZ':  # Windows executable
+        if header.startswith(EXECUTABLE_SIGNATURE):  # Windows executable
             logging.warning("Attachment detected as possible Windows executable")
             warnings_generated = True
             
         # Check for script signatures
-        if attachment_data.startswith(b'#!/') or attachment_data.startswith(b'<?php'):
+        if header.startswith(SCRIPT_SIGNATURES):
             logging.warning("Attachment detected as possible script file")
             warnings_generated = True
             
     return not warnings_generated
 
+# Directories this process has already created or found, so repeat calls
+# (one per MBOX file) skip the filesystem
+_CREATED_DIRS: Set[str] = set()
+
+def ensure_dir(path: str) -> None:
+    """Create a directory if this process hasn't already made sure it exists.
+    
+    Args:
+        path: Directory to create
+    """
+    if path not in _CREATED_DIRS:
+        os.makedirs(path, exist_ok=True)
+        _CREATED_DIRS.add(path)
+
 def setup_attachment_dir(output_dir: str) -> str:
     """Set up the directory for saving attachments.
     
@@ -154,50 +201,92 @@ def setup_attachment_dir(output_dir: str) -> str:
         Path to the attachment directory
     """
     save_dir = os.path.join(output_dir, 'attachments')
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
+    ensure_dir(save_dir)
     return save_dir
 
 def setup_database_connection(db_path: Optional[str] = None) -> Tuple[sqlite3.Connection, bool]:
     """Set up a database connection.
     
+    The database is created if needed and the connection gets the standard
+    write PRAGMAs (WAL journal, synchronous=NORMAL, larger cache, in-memory
+    temp store, mmap reads) before it is returned. Like the pooled
+    connections it is in autocommit mode, so transaction() alone opens and
+    commits the write transaction.
+    
     Args:
-        db_path: Path to the database file
+        db_path: Path to the database file (default database if None)
         
     Returns:
         Tuple of (database connection, whether to close the connection later)
     """
-    if db_path is None:
-        # Create a default database if none provided
-        create_db()
-        connection = sqlite3.connect('emaildb.sqlite3')
-        return connection, True
+    db_path = db_path or 'emaildb.sqlite3'
+    create_db(db_path)
+    return tune_connection(sqlite3.connect(db_path, isolation_level=None)), True
+
+# Mailboxes repeat the same few senders and recipients, so parsed addresses
+# are cached by their header text
+_parseaddr_cached = lru_cache(maxsize=4096)(email.utils.parseaddr)
+
+def parse_address(header_value: Any) -> Tuple[str, str]:
+    """Split an address header into (name, email), reusing earlier results.
     
-    return db_path, False
+    Args:
+        header_value: Header value; Header objects, which compat32 returns
+            for non-ASCII headers, are converted to text first
+        
+    Returns:
+        Tuple of (real name, email address)
+    """
+    if type(header_value) is not str:
+        header_value = str(header_value)
+    return _parseaddr_cached(header_value)
 
-def extract_email_details(message: Any) -> Tuple[str, str, str, str, str, str]:
-    """Extract basic email details from a message.
+def read_email_headers(message: Any) -> Tuple[Any, Any, Any, Any]:
+    """Read the raw headers the email details are built from.
     
     Args:
         message: Email message object
         
     Returns:
-        Tuple of (subject, sender_name, sender_email, receiver_name, receiver_email, date)
+        Tuple of (subject, sender_info, receiver_info, date)
     """
-    subject = message.get('subject', '')
-    sender_info = message.get('from', '')
-    date = message.get('date', '')
-    receiver_info = message.get('to', '')
+    return (message.get('subject', ''), message.get('from', ''),
+            message.get('to', ''), message.get('date', ''))
+
+def parse_email_details(subject: Any, sender_info: Any, receiver_info: Any,
+                        date: Any) -> Tuple[str, str, str, str, str, str]:
+    """Parse the addresses out of raw headers and check the subject.
     
-    sender_name, sender_email = email.utils.parseaddr(sender_info)
-    receiver_name, receiver_email = email.utils.parseaddr(receiver_info)
+    Args:
+        subject: Email subject
+        sender_info: Raw From header
+        receiver_info: Raw To header
+        date: Email date
+        
+    Returns:
+        Tuple of (subject, sender_name, sender_email, receiver_name, receiver_email, date)
+    """
+    sender_name, sender_email = parse_address(sender_info)
+    receiver_name, receiver_email = parse_address(receiver_info)
     
-    # Check for sensitive content in subject (for warning logs only)
-    if check_sensitive_content(subject):
+    # Check for sensitive content in subject (for warning logs only); the
+    # scan is skipped when INFO messages wouldn't be logged anyway
+    if logging.getLogger().isEnabledFor(logging.INFO) and check_sensitive_content(subject):
         logging.info("Potentially sensitive content detected in email subject")
     
     return subject, sender_name, sender_email, receiver_name, receiver_email, date
 
+def extract_email_details(message: Any) -> Tuple[str, str, str, str, str, str]:
+    """Extract basic email details from a message.
+    
+    Args:
+        message: Email message object
+        
+    Returns:
+        Tuple of (subject, sender_name, sender_email, receiver_name, receiver_email, date)
+    """
+    return parse_email_details(*read_email_headers(message))
+
 def has_required_fields(subject: str, sender_info: str, receiver_info: str) -> bool:
     """Check if the email has all required fields.
     
@@ -211,28 +300,345 @@ def has_required_fields(subject: str, sender_info: str, receiver_info: str) -> b
     """
     return bool(subject and sender_info and receiver_info)
 
-def save_attachment(attachment_data: bytes, attachment_path: str) -> bool:
-    """Save an attachment to disk.
+def drop_cached_pages(fd: int, length: int = 0, offset: int = 0) -> None:
+    """Advise the kernel that a file's cached pages won't be read again.
+    
+    Mailboxes and attachments are each touched once, so keeping them in the
+    page cache only evicts pages that are reused, such as the database's.
+    This is a hint: it does nothing where posix_fadvise is unavailable.
+    
+    Args:
+        fd: Open file descriptor
+        length: Number of bytes from offset, or 0 for the rest of the file
+        offset: Start of the region in bytes
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+    except OSError as e:
+        logging.debug(f"posix_fadvise failed: {e}")
+
+# Attachments are written with a single unbuffered write, so they are opened
+# at the OS level rather than through a buffered file object. O_EXCL makes
+# creating the file the check that no other attachment has the name.
+ATTACHMENT_OPEN_FLAGS = (os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                         | getattr(os, 'O_CLOEXEC', 0) | getattr(os, 'O_BINARY', 0))
+
+def create_attachment_file(path: str) -> int:
+    """Create an attachment file, failing if the name is already taken.
+    
+    ensure_dir() remembers the directories it has made sure of, but they can
+    be removed while a run goes on (by the background clean-up, say). When
+    the directory has gone, it is forgotten, created again and the file
+    opened once more.
+    
+    Args:
+        path: Path of the file to create
+        
+    Returns:
+        File descriptor open for writing
+        
+    Raises:
+        FileExistsError: If a file already has the name
+        OSError: If the file can't be created
+    """
+    try:
+        return os.open(path, ATTACHMENT_OPEN_FLAGS, 0o644)
+    except FileNotFoundError:
+        directory = os.path.dirname(path)
+        _CREATED_DIRS.discard(directory)
+        ensure_dir(directory)
+        return os.open(path, ATTACHMENT_OPEN_FLAGS, 0o644)
+
+def write_fully(fd: int, data: bytes) -> None:
+    """Write all of data to a file descriptor.
+    
+    os.write may write less than asked (and writes at most about 2 GB per
+    call), so the rest is written from a memoryview without copying.
+    
+    Args:
+        fd: File descriptor open for writing
+        data: Data to write
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def iter_attachment_paths(attachment_path: str) -> Iterator[str]:
+    """Yield the path to save an attachment to, then numbered alternatives.
+    
+    Args:
+        attachment_path: Path named after the attachment
+        
+    Yields:
+        attachment_path, then "name (1).ext", "name (2).ext" and so on
+    """
+    yield attachment_path
+    root, ext = os.path.splitext(attachment_path)
+    number = 1
+    while True:
+        yield f"{root} ({number}){ext}"
+        number += 1
+
+def has_content(path: str, data: bytes) -> bool:
+    """Check whether an existing file holds exactly data.
+    
+    Args:
+        path: Path of the existing file
+        data: Expected content
+        
+    Returns:
+        Whether the file's content is data (False if it can't be read)
+    """
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as file:
+            return file.read() == data
+    except OSError:
+        return False
+
+def has_digest(path: str, size: int, digest: bytes) -> bool:
+    """Check whether an existing file has the given size and SHA-1 digest.
+    
+    Only files of the right size are read, block by block.
+    
+    Args:
+        path: Path of the existing file
+        size: Expected size in bytes
+        digest: Expected SHA-1 digest
+        
+    Returns:
+        Whether the file matches (False if it can't be read)
+    """
+    try:
+        if os.path.getsize(path) != size:
+            return False
+        file_digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(STREAM_DECODE_BLOCK_SIZE), b''):
+                file_digest.update(block)
+        return file_digest.digest() == digest
+    except OSError:
+        return False
+
+# Path each attachment was saved to by this process, by the path it was
+# named after and its content digest, so repeated attachments (signature
+# images and the like) are kept only once; streamed ones are only known
+# once written, so a repeated copy is removed again
+_SAVED_ATTACHMENTS: Dict[Tuple[str, bytes], str] = {}
+
+def get_saved_attachment(key: Tuple[str, bytes]) -> Optional[str]:
+    """Look up where this process saved an attachment, if it is still there.
+    
+    An entry whose file has since been removed is dropped, so the attachment
+    is saved again rather than recorded at a path that no longer exists.
+    
+    Args:
+        key: Tuple of (path named after the attachment, SHA-1 digest)
+        
+    Returns:
+        Path the attachment is saved at, or None
+    """
+    saved_path = _SAVED_ATTACHMENTS.get(key)
+    if saved_path and not os.path.exists(saved_path):
+        del _SAVED_ATTACHMENTS[key]
+        return None
+    return saved_path
+
+def save_attachment(attachment_data: bytes, attachment_path: str) -> Optional[str]:
+    """Save an attachment to disk without overwriting a different one.
+    
+    When a file with the attachment's name already holds other content, the
+    attachment is saved under a numbered name instead. When it holds the same
+    content (or this process already saved it), nothing is written.
     
     Args:
         attachment_data: Attachment data
         attachment_path: Path to save the attachment
         
     Returns:
-        Whether the attachment was saved successfully
+        Path the attachment is saved at, or None if it couldn't be saved
     """
+    key = (attachment_path, hashlib.sha1(attachment_data).digest())
+    saved_path = get_saved_attachment(key)
+    if saved_path:
+        return saved_path
+    
     try:
-        with open(attachment_path, 'wb') as file:
-            file.write(attachment_data)
-        return True
+        for saved_path in iter_attachment_paths(attachment_path):
+            try:
+                fd = create_attachment_file(saved_path)
+            except FileExistsError:
+                if has_content(saved_path, attachment_data):
+                    break
+                continue
+            try:
+                write_fully(fd, attachment_data)
+                drop_cached_pages(fd, len(attachment_data))
+            finally:
+                os.close(fd)
+            break
+        _SAVED_ATTACHMENTS[key] = saved_path
+        return saved_path
     except IOError as e:
         logging.error(f"Failed to save attachment {os.path.basename(attachment_path)}: {e}")
-        return False
+        return None
+
+def save_attachment_blocks(blocks: Iterable[bytes], attachment_path: str) -> Optional[Tuple[bytes, int, str]]:
+    """Save an attachment to disk as its blocks are decoded.
+    
+    The file is only created once the first non-empty block arrives. Its
+    content isn't known up front, so any existing file with the name is
+    left alone and a numbered name is used. If this process already saved
+    the same content under the name, or a file with an earlier name already
+    holds it, the new copy is removed once the stream ends and the earlier
+    path is returned.
+    
+    Args:
+        blocks: Decoded attachment data, block by block
+        attachment_path: Path to save the attachment
+        
+    Returns:
+        Tuple of (first block, total size, path saved at), or None if the
+        file couldn't be written
+        
+    Raises:
+        ValueError: If decoding a block fails; a partly written file is removed
+    """
+    blocks = iter(blocks)
+    head = next(blocks, b'')
+    if not head:
+        return head, 0, ''
+    
+    digest = hashlib.sha1(head)
+    size = len(head)
+    try:
+        for saved_path in iter_attachment_paths(attachment_path):
+            try:
+                fd = create_attachment_file(saved_path)
+                break
+            except FileExistsError:
+                continue
+        complete = False
+        try:
+            write_fully(fd, head)
+            for block in blocks:
+                digest.update(block)
+                write_fully(fd, block)
+                size += len(block)
+            drop_cached_pages(fd, size)
+            complete = True
+        finally:
+            os.close(fd)
+            if not complete:
+                os.remove(saved_path)
+    except IOError as e:
+        logging.error(f"Failed to save attachment {os.path.basename(attachment_path)}: {e}")
+        return None
+    
+    key = (attachment_path, digest.digest())
+    existing_path = get_saved_attachment(key)
+    if not existing_path:
+        # The names taken before this one may hold the same content, saved
+        # by an earlier run into the same directory
+        for candidate in iter_attachment_paths(attachment_path):
+            if candidate == saved_path:
+                break
+            if has_digest(candidate, size, key[1]):
+                existing_path = candidate
+                break
+    
+    if existing_path and existing_path != saved_path:
+        try:
+            os.remove(saved_path)
+        except OSError as e:
+            logging.warning(f"Failed to remove repeated attachment {os.path.basename(saved_path)}: {e}")
+        saved_path = existing_path
+    
+    _SAVED_ATTACHMENTS[key] = saved_path
+    return head, size, saved_path
+
+def iter_base64_blocks(payload: str, block_size: int = STREAM_DECODE_BLOCK_SIZE) -> Iterator[bytes]:
+    """Decode a base64 payload one block at a time.
+    
+    Well-formed base64 decodes exactly as get_payload(decode=True) would.
+    Anything it would have to repair (stray characters, missing padding,
+    data after the padding) raises instead, so the caller can fall back to
+    the lenient whole-payload decoder.
+    
+    Args:
+        payload: Encoded payload, including its line breaks
+        block_size: Number of encoded characters to decode at a time
+        
+    Yields:
+        Decoded data
+        
+    Raises:
+        binascii.Error: If the payload isn't well-formed base64
+    """
+    leftover = ''
+    padded = False
+    for offset in range(0, len(payload), block_size):
+        chunk = leftover + payload[offset:offset + block_size].replace('\r', '').replace('\n', '')
+        usable = len(chunk) - len(chunk) % 4
+        leftover = chunk[usable:]
+        if not usable:
+            continue
+        if padded:
+            raise binascii.Error("Data after base64 padding")
+        padded = chunk[usable - 1] == '='
+        yield base64.b64decode(chunk[:usable], validate=True)
+    if leftover:
+        raise binascii.Error("Incomplete base64 data")
+
+def save_attachment_part(part: Any, content_type: str, attachment_path: str) -> Optional[str]:
+    """Decode an attachment part, check it and save it to disk.
+    
+    Large base64 parts are decoded block by block straight into the file,
+    so the decoded attachment is never held in memory alongside its
+    encoded text.
+    
+    Args:
+        part: Message part holding the attachment
+        content_type: MIME type of the attachment
+        attachment_path: Path to save the attachment
+        
+    Returns:
+        Path the attachment is saved at, or None if the part had no data or
+        couldn't be saved
+    """
+    if str(part.get('content-transfer-encoding', '')).lower() == 'base64':
+        encoded = part.get_payload()
+        if isinstance(encoded, str) and len(encoded) >= STREAM_DECODE_MIN_SIZE:
+            try:
+                written = save_attachment_blocks(iter_base64_blocks(encoded), attachment_path)
+            except ValueError:
+                # Not well-formed base64; decode it leniently, as a whole
+                pass
+            else:
+                if written is None:
+                    return None
+                head, size, saved_path = written
+                if not size:
+                    return None
+                # Security checks - warnings only, don't block
+                check_attachment(content_type, head, size)
+                return saved_path
+    
+    attachment_data = part.get_payload(decode=True)
+    if not attachment_data:
+        return None
+    
+    # Security checks - warnings only, don't block
+    check_attachment(content_type, attachment_data)
+    return save_attachment(attachment_data, attachment_path)
 
 def create_email_data(subject: str, sender_name: str, sender_email: str, 
                      receiver_name: str, receiver_email: str, date: str,
                      attachment_name: str = "", content_type: str = "",
-                     source_pst: str = "") -> Dict[str, str]:
+                     source_pst: str = "", new_email: bool = True) -> Dict[str, Any]:
     """Create a dictionary of email data.
     
     Args:
@@ -245,6 +651,8 @@ def create_email_data(subject: str, sender_name: str, sender_email: str,
         attachment_name: Attachment name
         content_type: Attachment content type
         source_pst: Source PST file name
+        new_email: False for every record of a message after the first, so
+            the attachments of one message are stored as one email
         
     Returns:
         Dictionary of email data
@@ -258,18 +666,41 @@ def create_email_data(subject: str, sender_name: str, sender_email: str,
         'attachment_filename': attachment_name,
         'attachment_type': content_type,
         'email_date': date,
-        'source_pst': source_pst
+        'source_pst': source_pst,
+        NEW_EMAIL_KEY: new_email
     }
 
+def create_email_row(subject: Any, sender_name: str, sender_email: str,
+                     receiver_name: str, receiver_email: str, date: Any,
+                     attachment_name: str = "", content_type: str = "",
+                     source_pst: str = "", new_email: bool = True) -> Tuple[Any, ...]:
+    """Create a row tuple ready for insert_many(), without an intermediate dictionary.
+    
+    Takes the same arguments as create_email_data(). Header objects (as
+    compat32 returns for non-ASCII subjects and dates) are converted to
+    text, as prepare_email_data() would.
+    
+    Returns:
+        Tuple of values in db_manager.EMAIL_FIELDS order, then new_email
+    """
+    if type(subject) is not str:
+        subject = str(subject or '')
+    if type(date) is not str:
+        date = str(date or '')
+    return (subject, sender_name, sender_email, receiver_name, receiver_email,
+            attachment_name, content_type, date, source_pst, new_email)
+
 def process_message_attachments(message: Any, save_dir: str, 
                               subject: str, sender_name: str, sender_email: str,
                               receiver_name: str, receiver_email: str, date: str,
-                              source_pst: str, db_connection: Any) -> List[Dict[str, str]]:
+                              source_pst: str,
+                              make_record: Callable[..., Any] = create_email_data) -> List[Any]:
     """Process attachments in a message.
     
     Args:
         message: Email message object
-        save_dir: Directory to save attachments
+        save_dir: Directory to save attachments, or None to only record
+            their names and types without decoding them
         subject: Email subject
         sender_name: Sender name
         sender_email: Sender email
@@ -277,64 +708,318 @@ def process_message_attachments(message: Any, save_dir: str,
         receiver_email: Receiver email
         date: Email date
         source_pst: Source PST file name
-        db_connection: Database connection
+        make_record: Builds each record; create_email_row() gives row
+            tuples instead of dictionaries
         
     Returns:
-        List of dictionaries containing email details
+        List of records (dictionaries by default) containing email details
     """
     data = []
     has_attachments = False
     
-    for part in message.walk():
-        if part.get_content_maintype() == 'multipart':
-            continue
+    # A single-part message without Content-Disposition has nothing to walk
+    if message.is_multipart() or message.get('Content-Disposition') is not None:
+        parts = message.walk()
+    else:
+        parts = ()
+    
+    for part in parts:
+        # Cheapest checks first: most parts have no Content-Disposition, and
+        # the content type is only worked out for parts with a filename
         if part.get('Content-Disposition') is None:
             continue
             
         attachment_name = part.get_filename()
         if not attachment_name:
             continue
-            
-        has_attachments = True
+        
         content_type = part.get_content_type()
-        attachment_data = part.get_payload(decode=True)
-            
-        if attachment_data:
-            # Security checks - warnings only, don't block
-            check_attachment(content_type, attachment_data)
-            
-            # Sanitize filename for path safety only
-            original_name = attachment_name
-            safe_name = sanitize_filename(attachment_name)
-            if original_name != safe_name:
-                logging.info(f"Sanitized attachment filename for path safety: {original_name} -> {safe_name}")
-                attachment_name = safe_name
+        if content_type.startswith('multipart/'):
+            continue
             
-            attachment_path = os.path.join(save_dir, attachment_name)
-            if save_attachment(attachment_data, attachment_path):
-                logging.info(f"Saved attachment: {attachment_name}")
-                
-                email_data = create_email_data(
-                    subject, sender_name, sender_email, 
-                    receiver_name, receiver_email, date,
-                    attachment_name, content_type, source_pst
-                )
-                data.append(email_data)
-                store_data(email_data, db_connection)
+        has_attachments = True
+        
+        # Sanitize filename for path safety only
+        original_name = attachment_name
+        safe_name = sanitize_filename(attachment_name)
+        if original_name != safe_name:
+            logging.info(f"Sanitized attachment filename for path safety: {original_name} -> {safe_name}")
+            attachment_name = safe_name
+        
+        if save_dir is not None:
+            # The attachment may be saved under a numbered name when another
+            # attachment already has this one
+            saved_path = save_attachment_part(part, content_type, os.path.join(save_dir, attachment_name))
+            if not saved_path:
+                continue
+            attachment_name = os.path.basename(saved_path)
+            logging.info(f"Saved attachment: {attachment_name}")
+        
+        # Only the first record of the message starts a new email
+        email_data = make_record(
+            subject, sender_name, sender_email, 
+            receiver_name, receiver_email, date,
+            attachment_name, content_type, source_pst, new_email=not data
+        )
+        data.append(email_data)
     
     # If no attachments, still store the email details
     if not has_attachments:
-        email_data = create_email_data(
+        email_data = make_record(
             subject, sender_name, sender_email, 
             receiver_name, receiver_email, date,
             source_pst=source_pst
         )
         data.append(email_data)
-        store_data(email_data, db_connection)
     
     return data
 
-def parse_mbox_file(mbox_file: str, output_dir: str, db_connection: Optional[sqlite3.Connection] = None, source_pst: str = "") -> List[Dict[str, str]]:
+class MappedMbox(mailbox.mbox):
+    """An mbox mailbox that indexes its messages by scanning a memory map.
+    
+    mailbox.mbox builds its table of contents with one readline() call per
+    line of the file; on multi-gigabyte folders that dominates opening the
+    mailbox. Here the "From " separator lines are found with bytes.find()
+    over an mmap of the file, producing the same message boundaries.
+    
+    Iterating also reads from the mmap: each message slice goes straight to
+    one shared compat32 BytesParser rather than through get_message().
+    """
+    
+    _FROM_LINE = b'\nFrom '
+    
+    # Content types whose body the parser has to split into sub-messages
+    _NESTED_MAINTYPES = ('multipart', 'message')
+    
+    def _line_before_is_empty(self, data: mmap.mmap, pos: int) -> bool:
+        """Check whether the line ending at pos is an empty line."""
+        sep_len = len(mailbox.linesep)
+        if pos < sep_len or data[pos - sep_len:pos] != mailbox.linesep:
+            return False
+        return pos == sep_len or data[pos - sep_len - 1:pos - sep_len] == b'\n'
+    
+    def _iter_spans(self, data: mmap.mmap, first: int = 0,
+                    last: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """Yield the (start, stop) offsets of each message in file order.
+        
+        Only data[first:last] is scanned; both offsets must fall on message
+        boundaries (as split_ranges() returns) to give the same messages as
+        a scan of the whole file.
+        """
+        if last is None:
+            last = len(data)
+        start = first if data[first:first + 5] == b'From ' else None
+        pos = data.find(self._FROM_LINE, first, last)
+        while True:
+            end = pos + 1 if pos != -1 else last
+            if start is not None:
+                # A message ends before the blank line that precedes the next
+                # separator (or the end of the file), if there is one
+                if self._line_before_is_empty(data, end):
+                    yield start, end - len(mailbox.linesep)
+                else:
+                    yield start, end
+            if pos == -1:
+                return
+            start = end
+            pos = data.find(self._FROM_LINE, pos + 1, last)
+    
+    def _set_toc(self, spans: List[Tuple[int, int]], file_length: int) -> None:
+        """Install a table of contents built from message offsets."""
+        self._toc = dict(enumerate(spans))
+        self._next_key = len(self._toc)
+        self._file_length = file_length
+    
+    def _generate_toc(self) -> None:
+        """Generate key-to-(start, stop) table of contents."""
+        self._file.seek(0, os.SEEK_END)
+        file_length = self._file.tell()
+        spans = []
+        
+        if file_length:
+            with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                spans = list(self._iter_spans(data))
+        
+        self._set_toc(spans, file_length)
+    
+    def _parse_message(self, parser: email.parser.BytesParser, message_bytes: bytes) -> email.message.Message:
+        """Parse a message, feeding only its header block to the parser when possible.
+        
+        A single-part body is kept as the payload verbatim, as the full parse
+        would, so only multipart and nested messages pay for a line-by-line
+        parse of their body (and its attachments).
+        """
+        header_end = message_bytes.find(b'\n\n')
+        # Anything unusual about the header block (CR line endings, a leading
+        # blank line, non-header lines, defects) falls back to the full parse
+        if (header_end > 0 and not message_bytes.startswith(b'\n')
+                and b'\r' not in message_bytes[:header_end]):
+            message = parser.parsebytes(message_bytes[:header_end + 1], headersonly=True)
+            # A payload here means a line in the block was not a header
+            if (not message.defects and not message.get_payload()
+                    and message.get_content_maintype() not in self._NESTED_MAINTYPES):
+                message.set_payload(message_bytes[header_end + 2:].decode('ascii', 'surrogateescape'))
+                return message
+        return parser.parsebytes(message_bytes)
+    
+    def _read_message(self, parser: email.parser.BytesParser, data: mmap.mmap,
+                      start: int, stop: int) -> email.message.Message:
+        """Parse the message stored at data[start:stop]."""
+        from_end = data.find(b'\n', start, stop)
+        if from_end == -1:
+            from_end = stop
+        message_bytes = data[from_end + 1:stop]
+        if mailbox.linesep != b'\n':
+            message_bytes = message_bytes.replace(mailbox.linesep, b'\n')
+        message = self._parse_message(parser, message_bytes)
+        from_line = data[start:from_end].rstrip(b'\r')
+        message.set_unixfrom(from_line.decode('ascii', 'replace'))
+        return message
+    
+    def itervalues(self) -> Iterator[email.message.Message]:
+        """Yield each message, parsed from its slice of a memory map.
+        
+        Messages are plain compat32 email.message.Message objects with the
+        "From " separator line available through get_unixfrom(). When the
+        table of contents hasn't been built yet, message boundaries are found
+        while the messages are read, so the file is scanned only once.
+        """
+        parser = email.parser.BytesParser(policy=email.policy.compat32)
+        
+        if self._toc is None:
+            self._file.seek(0, os.SEEK_END)
+            file_length = self._file.tell()
+            spans = []
+            if file_length:
+                with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for start, stop in self._iter_spans(data):
+                        spans.append((start, stop))
+                        yield self._read_message(parser, data, start, stop)
+                drop_cached_pages(self._file.fileno())
+            # A complete pass leaves the table of contents built
+            self._set_toc(spans, file_length)
+            return
+        
+        if not self._toc:
+            return
+        
+        # Messages added but not yet flushed must reach the file before mapping it
+        self._file.flush()
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start, stop in list(self._toc.values()):
+                yield self._read_message(parser, data, start, stop)
+        drop_cached_pages(self._file.fileno())
+    
+    def split_ranges(self, parts: int) -> List[Tuple[int, int]]:
+        """Split the file into byte ranges of about equal size on message boundaries.
+        
+        Each range can be parsed on its own with iter_range(), for example in
+        a separate process.
+        
+        Args:
+            parts: Number of ranges to aim for; fewer come back when the
+                file holds fewer messages
+            
+        Returns:
+            List of (first, last) byte offsets covering the whole file
+        """
+        self._file.seek(0, os.SEEK_END)
+        file_length = self._file.tell()
+        if not file_length:
+            return []
+        
+        bounds = [0]
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for part in range(1, parts):
+                # The next separator at or after the target offset starts a range
+                pos = data.find(self._FROM_LINE, max(bounds[-1], file_length * part // parts - 1))
+                if pos == -1:
+                    break
+                bounds.append(pos + 1)
+        bounds.append(file_length)
+        return list(zip(bounds, bounds[1:]))
+    
+    def iter_range(self, first: int, last: int) -> Iterator[email.message.Message]:
+        """Yield the messages stored in the byte range [first, last).
+        
+        Args:
+            first: Offset of the first message, as returned by split_ranges()
+            last: Offset just past the last message
+            
+        Yields:
+            Messages in file order, as itervalues() returns them
+        """
+        parser = email.parser.BytesParser(policy=email.policy.compat32)
+        self._file.flush()
+        with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start, stop in self._iter_spans(data, first, last):
+                yield self._read_message(parser, data, start, stop)
+        drop_cached_pages(self._file.fileno(), last - first, first)
+
+def iter_mbox_emails(mbox: Any, save_dir: str, source_pst: str = "",
+                     make_record: Callable[..., Any] = create_email_data) -> Iterator[Any]:
+    """Lazily yield the email records for every message in a mailbox.
+    
+    Attachments are saved as each message is reached, so records can be
+    consumed (for example by executemany) without holding the mailbox in memory.
+    
+    Args:
+        mbox: Mailbox object to iterate
+        save_dir: Directory to save attachments, or None to only record
+            their names and types
+        source_pst: Source PST file name for tracking origin
+        make_record: Builds each record; pass create_email_row() to get row
+            tuples for insert_many() directly
+        
+    Yields:
+        Records (dictionaries by default) containing email details
+    """
+    for message in mbox:
+        # Messages missing a required header are skipped before any parsing
+        subject, sender_info, receiver_info, date = read_email_headers(message)
+        if not has_required_fields(subject, sender_info, receiver_info):
+            logging.warning("Skipping message with missing fields.")
+            continue
+        
+        # Extract email details
+        subject, sender_name, sender_email, receiver_name, receiver_email, date = parse_email_details(
+            subject, sender_info, receiver_info, date
+        )
+        
+        # Process attachments and yield the rows to store
+        yield from process_message_attachments(
+            message, save_dir, subject, sender_name, sender_email,
+            receiver_name, receiver_email, date, source_pst, make_record
+        )
+
+def parse_mbox_rows(mbox_file: str, output_dir: str, source_pst: str = "",
+                    byte_range: Optional[Tuple[int, int]] = None) -> List[Tuple]:
+    """Parse an MBOX file into rows ready for insert_many(), without a database.
+    
+    Lets the CPU-bound parsing run in worker processes while a single
+    connection does all the writing.
+    
+    Args:
+        mbox_file: Path to the MBOX file
+        output_dir: Directory to save attachments
+        source_pst: Source PST file name for tracking origin
+        byte_range: (first, last) offsets from MappedMbox.split_ranges() to
+            parse only part of the file, or None for all of it
+        
+    Returns:
+        List of prepared row tuples
+    """
+    save_dir = setup_attachment_dir(output_dir)
+    mbox = MappedMbox(mbox_file)
+    try:
+        messages = mbox if byte_range is None else mbox.iter_range(*byte_range)
+        return list(iter_mbox_emails(messages, save_dir, source_pst, create_email_row))
+    finally:
+        mbox.close()
+
+def parse_mbox_file(mbox_file: str, output_dir: str, db_connection: Optional[sqlite3.Connection] = None,
+                    source_pst: str = "", keep_data: bool = True,
+                    extract_attachments: bool = True) -> List[Dict[str, str]]:
     """Parse an MBOX file and extract email details.
     
     Args:
@@ -342,54 +1027,48 @@ def parse_mbox_file(mbox_file: str, output_dir: str, db_connection: Optional[sql
         output_dir: Directory to save attachments
         db_connection: Optional SQLite connection to reuse
         source_pst: Source PST file name for tracking origin
+        keep_data: Whether to collect and return the email details; when
+            False, records are streamed straight into the database
+        extract_attachments: Whether to decode and save attachments; when
+            False, only their names and types are recorded
         
     Returns:
-        List of dictionaries containing email details
+        List of dictionaries containing email details (empty if keep_data is False)
     """
     data = []
-    save_dir = setup_attachment_dir(output_dir)
+    save_dir = setup_attachment_dir(output_dir) if extract_attachments else None
     
     # Determine whether we need to close the connection later
     close_connection = False
     if db_connection is None:
         # Create a default database if none provided
-        create_db()
-        db_connection = sqlite3.connect('emaildb.sqlite3')
-        close_connection = True
+        db_connection, close_connection = setup_database_connection()
         
     try:
-        # Start a transaction for better performance
-        db_connection.execute('BEGIN TRANSACTION')
-        
-        # Get the mailbox object - handle both test mocks and real files
-        mbox = mailbox.mbox(mbox_file)
-        logging.info(f"Processing {len(mbox)} messages from {mbox_file}")
-        
-        for message in mbox:
-            # Extract email details
-            subject, sender_name, sender_email, receiver_name, receiver_email, date = extract_email_details(message)
-            
-            if not has_required_fields(subject, sender_name, receiver_name):
-                logging.warning("Skipping message with missing fields.")
-                continue
+        # Insert every email from this file in a single transaction
+        with transaction(db_connection):
+            # Get the mailbox object - handle both test mocks and real files.
+            # Messages are counted as they are stored rather than with a
+            # separate pass over the file up front
+            mbox = MappedMbox(mbox_file)
+            logging.info(f"Processing messages from {mbox_file}")
             
-            # Process attachments and store data
-            message_data = process_message_attachments(
-                message, save_dir, subject, sender_name, sender_email,
-                receiver_name, receiver_email, date, source_pst, db_connection
-            )
-            data.extend(message_data)
+            # executemany pulls records from the generator one at a time;
+            # without keep_data the rows are built as tuples directly
+            if keep_data:
+                data = list(iter_mbox_emails(mbox, save_dir, source_pst))
+                stored = insert_email_rows(db_connection, data)
+            else:
+                stored = insert_many(db_connection, iter_mbox_emails(mbox, save_dir, source_pst, create_email_row))
         
-        # Commit the transaction
-        db_connection.commit()
-        logging.info(f"Processed {len(data)} emails from {mbox_file}")
+        logging.info(f"Processed {stored} records from {mbox_file}")
         
         # Close the mbox file if it's not a mock
         if hasattr(mbox, 'close'):
             mbox.close()
             
     except Exception as e:
-        db_connection.rollback()
+        # The transaction has already been rolled back
         logging.error(f"Failed to parse mbox file {mbox_file}: {e}")
         raise
     finally:
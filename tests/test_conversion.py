@@ -4,11 +4,15 @@ import tempfile
 import shutil
 import subprocess
 import unittest
-from unittest.mock import patch, MagicMock
+import concurrent.futures
+import email.message
+import mailbox
+from unittest.mock import patch, MagicMock, call
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import main
+from db_manager import close_all_connections, get_email_count, prepare_email_data
 
 class TestConversion(unittest.TestCase):
     """Tests for the PST to MBOX conversion functionality."""
@@ -32,6 +36,9 @@ class TestConversion(unittest.TestCase):
     
     def tearDown(self):
         """Clean up after tests."""
+        # Drop cached connections to databases inside the temporary directory
+        close_all_connections()
+        
         # Remove temporary directory
         shutil.rmtree(self.test_dir)
     
@@ -46,19 +53,48 @@ class TestConversion(unittest.TestCase):
         file_name = 'test.pst'
         
         # Call the function
-        result = main.convert_single_pst((file_path, file_name, self.mbox_dir))
+        # readpst's output folder holds the MBOX files it produced
+        os.makedirs(os.path.join(self.mbox_dir, 'test', 'Inbox'))
+        open(os.path.join(self.mbox_dir, 'test', 'Inbox', 'Inbox.mbox'), 'w').close()
         
-        # Verify the result
-        self.assertTrue(result)
+        result = main.convert_single_pst((file_path, file_name, self.mbox_dir, 1))
+        
+        # Verify the result reports the produced MBOX files
+        self.assertEqual(result, (True, [os.path.join(self.mbox_dir, 'test', 'Inbox', 'Inbox.mbox')]))
         
         # Verify the command was called correctly
         mock_run.assert_called_once()
         args = mock_run.call_args[0][0]
-        self.assertEqual(args[0], 'readpst')
-        self.assertEqual(args[4], os.path.join(self.mbox_dir, 'test'))
-        self.assertEqual(args[5], file_path)
+        self.assertEqual(os.path.basename(args[0]), 'readpst')
+        self.assertNotIn('-j', args)
+        self.assertEqual(args[-2], os.path.join(self.mbox_dir, 'test'))
+        self.assertEqual(args[-1], file_path)
+        
+        # readpst's progress output is discarded, its errors are captured
+        self.assertEqual(mock_run.call_args[1]['stdout'], subprocess.DEVNULL)
+        self.assertEqual(mock_run.call_args[1]['stderr'], subprocess.PIPE)
+    
+    @patch('subprocess.run')
+    def test_convert_single_pst_readpst_jobs(self, mock_run):
+        """Test that spare cores are handed to readpst's -j option."""
+        mock_run.return_value = subprocess.CompletedProcess(args=[], returncode=0)
+        file_path = os.path.join(self.target_dir, 'test.pst')
+        
+        self.assertTrue(main.convert_single_pst((file_path, 'test.pst', self.mbox_dir, 4))[0])
+        
+        args = mock_run.call_args[0][0]
+        self.assertEqual(args[args.index('-j') + 1], '4')
+        self.assertEqual(args[-1], file_path)
+        
+        # Jobs are shared between the conversions running at once
+        with patch('os.cpu_count', return_value=8):
+            self.assertEqual(main.get_readpst_jobs(2), 4)
+            self.assertEqual(main.get_readpst_jobs(16), 1)
+            # Parsing processes are shared out the same way between ingests
+            self.assertEqual(main.get_parse_workers(1), 8)
+            self.assertEqual(main.get_parse_workers(0), 8)
     
-    @patch('subprocess.run', side_effect=subprocess.CalledProcessError(1, []))
+    @patch('subprocess.run', side_effect=subprocess.CalledProcessError(1, [], stderr=b'corrupt file'))
     def test_convert_single_pst_error(self, mock_run):
         """Test error handling when converting a PST file."""
         # Test data
@@ -66,20 +102,34 @@ class TestConversion(unittest.TestCase):
         file_name = 'test.pst'
         
         # Call the function
-        result = main.convert_single_pst((file_path, file_name, self.mbox_dir))
+        with self.assertLogs(level='ERROR') as logs:
+            result = main.convert_single_pst((file_path, file_name, self.mbox_dir, 1))
         
-        # Verify the result
-        self.assertFalse(result)
+        # Verify the result and that readpst's error output was logged
+        self.assertEqual(result, (False, []))
+        self.assertIn('corrupt file', logs.output[0])
     
-    @patch('os.walk')
-    @patch('os.makedirs')
-    @patch('concurrent.futures.ProcessPoolExecutor')
-    def test_pst_to_mbox(self, mock_executor, mock_makedirs, mock_walk):
+    @patch('subprocess.run', side_effect=FileNotFoundError('readpst'))
+    def test_convert_single_pst_missing_readpst(self, mock_run):
+        """Test that a missing readpst binary fails the file instead of the worker."""
+        file_path = os.path.join(self.target_dir, 'test.pst')
+        
+        self.assertEqual(main.convert_single_pst((file_path, 'test.pst', self.mbox_dir, 1)), (False, []))
+    
+    def _make_target_dir(self, *names):
+        """Create a fresh target directory containing the given files."""
+        target_dir = tempfile.mkdtemp(dir=self.test_dir)
+        for name in names:
+            path = os.path.join(target_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'dummy content')
+        return target_dir
+    
+    @patch('concurrent.futures.ThreadPoolExecutor')
+    def test_pst_to_mbox(self, mock_executor):
         """Test converting multiple PST files."""
-        # Mock os.walk to return PST files
-        mock_walk.return_value = [
-            (self.target_dir, [], ['test1.pst', 'test2.pst', 'file.txt'])
-        ]
+        target_dir = self._make_target_dir('test1.pst', os.path.join('nested', 'test2.OST'), 'file.txt')
         
         # Set up mock executor
         mock_context = MagicMock()
@@ -87,41 +137,172 @@ class TestConversion(unittest.TestCase):
         mock_context.__enter__.return_value = mock_instance
         mock_executor.return_value = mock_context
         
-        # Mock map to return success status for each PST file
-        mock_instance.map.return_value = [True, True]
+        # Mock submit to return a completed future for each PST file
+        def completed_future(fn, task):
+            future = concurrent.futures.Future()
+            future.set_result((True, []))
+            return future
+        mock_instance.submit.side_effect = completed_future
         
         # Test pst_to_mbox function
-        result = main.pst_to_mbox(self.target_dir, self.mbox_dir)
+        result = main.pst_to_mbox(target_dir, self.mbox_dir)
         
-        # Verify the result
-        self.assertEqual(result, ['test1.pst', 'test2.pst'])
+        # Verify the result; extensions match regardless of case
+        self.assertEqual(sorted(result), ['test1.pst', 'test2.OST'])
         
-        # Verify the executor was called with the correct parameters
-        mock_instance.map.assert_called_once()
+        # Conversions only wait on readpst, so they run on a thread pool
+        mock_executor.assert_called_once_with(max_workers=min(os.cpu_count() or 1, 2))
         
-        # Check that the first argument to map is the convert_single_pst function
-        self.assertEqual(mock_instance.map.call_args[0][0], main.convert_single_pst)
+        # Verify one task was submitted per PST file
+        self.assertEqual(mock_instance.submit.call_count, 2)
+        
+        # Check that each task runs the convert_single_pst function
+        for submit_call in mock_instance.submit.call_args_list:
+            self.assertEqual(submit_call[0][0], main.convert_single_pst)
         
         # Check that the conversion tasks list contains the correct files
-        conversion_tasks = mock_instance.map.call_args[0][1]
+        conversion_tasks = [submit_call[0][1] for submit_call in mock_instance.submit.call_args_list]
         self.assertEqual(len(conversion_tasks), 2)
         
-        # Each conversion task should be a tuple of (file_path, file_name, mbox_dir)
-        self.assertEqual(conversion_tasks[0][1], 'test1.pst')
-        self.assertEqual(conversion_tasks[1][1], 'test2.pst')
+        # Each conversion task should be a tuple of (file_path, file_name, mbox_dir, readpst_jobs)
+        readpst_jobs = main.get_readpst_jobs(min(os.cpu_count() or 1, 2))
+        self.assertEqual(sorted(conversion_tasks), [
+            (os.path.join(target_dir, 'nested', 'test2.OST'), 'test2.OST', self.mbox_dir, readpst_jobs),
+            (os.path.join(target_dir, 'test1.pst'), 'test1.pst', self.mbox_dir, readpst_jobs)
+        ])
     
-    @patch('os.walk')
-    def test_pst_to_mbox_no_files(self, mock_walk):
+    @patch('concurrent.futures.ThreadPoolExecutor')
+    def test_pst_to_mbox_worker_failure(self, mock_executor):
+        """Test that a crashed conversion worker is reported as a failed file."""
+        target_dir = self._make_target_dir('test1.pst', 'test2.pst')
+        
+        mock_context = MagicMock()
+        mock_instance = MagicMock()
+        mock_context.__enter__.return_value = mock_instance
+        mock_executor.return_value = mock_context
+        
+        # The first file converts, the second worker raises
+        def finished_future(fn, task):
+            future = concurrent.futures.Future()
+            if task[1] == 'test2.pst':
+                future.set_exception(RuntimeError("worker died"))
+            else:
+                future.set_result((True, []))
+            return future
+        mock_instance.submit.side_effect = finished_future
+        
+        converted = []
+        result = main.pst_to_mbox(target_dir, self.mbox_dir,
+                                  on_converted=lambda pst, mbox_files, left: converted.append(pst))
+        
+        self.assertEqual(result, ['test1.pst'])
+        # Only successful conversions are handed on as they finish
+        self.assertEqual(converted, ['test1.pst'])
+    
+    def test_list_mbox_files(self):
+        """Test finding MBOX files in nested folders."""
+        nested_dir = os.path.join(self.mbox_dir, 'test', 'Inbox')
+        os.makedirs(nested_dir)
+        for name in ('Inbox.mbox', 'Sent.MBOX', 'notes.txt'):
+            with open(os.path.join(nested_dir, name), 'w') as f:
+                f.write('')
+        with open(os.path.join(self.mbox_dir, 'root.mbox'), 'w') as f:
+            f.write('')
+        
+        result = main.list_mbox_files(self.mbox_dir)
+        
+        self.assertEqual(sorted(result), sorted([
+            os.path.join(nested_dir, 'Inbox.mbox'),
+            os.path.join(nested_dir, 'Sent.MBOX'),
+            os.path.join(self.mbox_dir, 'root.mbox')
+        ]))
+    
+    def test_pst_to_mbox_bounded_submission(self):
+        """Test that conversions are submitted one per worker as others finish."""
+        target_dir = self._make_target_dir('test1.pst', 'test2.pst', 'test3.pst')
+        events = []
+        
+        # A caller-supplied executor is used as-is and not shut down
+        executor = MagicMock()
+        def completed_future(fn, task):
+            events.append(('submit', task[1]))
+            future = concurrent.futures.Future()
+            future.set_result((True, []))
+            return future
+        executor.submit.side_effect = completed_future
+        
+        result = main.pst_to_mbox(target_dir, self.mbox_dir, max_workers=1,
+                                  on_converted=lambda pst, mbox_files, left: events.append(('converted', pst, left)),
+                                  executor=executor)
+        
+        self.assertEqual(sorted(result), ['test1.pst', 'test2.pst', 'test3.pst'])
+        # With one worker, each file is submitted only after the previous one finished
+        self.assertEqual([event[0] for event in events],
+                         ['submit', 'converted', 'submit', 'converted', 'submit', 'converted'])
+        # Each callback is told how many conversions have not finished yet
+        self.assertEqual([event[2] for event in events if event[0] == 'converted'], [2, 1, 0])
+        executor.shutdown.assert_not_called()
+    
+    def test_pst_to_mbox_no_files(self):
         """Test when there are no PST files to convert."""
-        # Mock os.walk to return no files
-        mock_walk.return_value = [(self.target_dir, [], [])]
+        target_dir = self._make_target_dir('notes.txt')
         
         # Call the function
-        pst_files = main.pst_to_mbox(self.target_dir, self.mbox_dir)
+        pst_files = main.pst_to_mbox(target_dir, self.mbox_dir)
         
         # Verify the result
         self.assertEqual(len(pst_files), 0)
     
+    def test_determine_source_pst(self):
+        """Test naming the source PST from an MBOX file path."""
+        nested_mbox = os.path.join(self.mbox_dir, 'outlook', 'Inbox', 'Projects', 'mbox.mbox')
+        
+        # The first folder below the MBOX directory is the PST's output folder
+        self.assertEqual(main.determine_source_pst(nested_mbox, self.mbox_dir), 'outlook.pst')
+        
+        # Without the MBOX directory the parent folder is used
+        self.assertEqual(main.determine_source_pst(os.path.join('archive', 'file.mbox')), 'archive.pst')
+        self.assertEqual(main.determine_source_pst('file.mbox'), '')
+    
+    def test_get_attachment_sizes(self):
+        """Test collecting attachment sizes from nested folders."""
+        attachment_dir = os.path.join(self.output_dir, 'attachments')
+        os.makedirs(os.path.join(attachment_dir, 'nested'))
+        with open(os.path.join(attachment_dir, 'report.pdf'), 'wb') as f:
+            f.write(b'x' * 10)
+        with open(os.path.join(attachment_dir, 'nested', 'photo.jpg'), 'wb') as f:
+            f.write(b'x' * 3)
+        
+        self.assertEqual(main.get_attachment_sizes(attachment_dir), {'report.pdf': 10, 'photo.jpg': 3})
+        self.assertEqual(main.get_attachment_sizes(os.path.join(self.test_dir, 'missing')), {})
+    
+    def test_start_clean_up(self):
+        """Test that directories are removed on a background thread."""
+        directory = os.path.join(self.output_dir, 'converted')
+        os.makedirs(os.path.join(directory, 'Inbox'))
+        open(os.path.join(directory, 'Inbox', 'mbox'), 'wb').close()
+        
+        thread = main.start_clean_up(directory)
+        self.assertFalse(thread.daemon)
+        thread.join()
+        self.assertFalse(os.path.exists(directory))
+    
+    def test_format_size(self):
+        """Test that sizes switch unit at each power of 1024."""
+        self.assertEqual(main.format_size(0), "0.00 B")
+        self.assertEqual(main.format_size(1023), "1023.00 B")
+        self.assertEqual(main.format_size(1024), "1.00 KB")
+        self.assertEqual(main.format_size(1536), "1.50 KB")
+        self.assertEqual(main.format_size(1024 ** 3 - 1), "1024.00 MB")
+        self.assertEqual(main.format_size(5 * 1024 ** 4), "5.00 TB")
+        self.assertEqual(main.format_size(1024 ** 5), "1024.00 TB")
+    
+    def test_pst_to_mbox_missing_target_dir(self):
+        """Test that a missing target directory finds no PST files."""
+        missing_dir = os.path.join(self.test_dir, 'missing')
+        
+        self.assertEqual(main.pst_to_mbox(missing_dir, self.mbox_dir), [])
+    
     @patch('main.parse_mbox_file')
     @patch('os.path.exists')
     @patch('os.walk')
@@ -177,53 +358,49 @@ class TestConversion(unittest.TestCase):
             "subfolder2.pst"
         )
     
+    @patch('concurrent.futures.ProcessPoolExecutor', concurrent.futures.ThreadPoolExecutor)
     @patch('main.find_all_mbox_files')
-    @patch('os.path.exists')
-    @patch('os.path.join', side_effect=lambda *args: '/'.join(args))
-    @patch('main.parse_mbox_file')
+    @patch('main.parse_mbox_rows')
     @patch('main.clean_up_directory')
-    @patch('os.makedirs')
-    @patch('db_manager.get_db_connection')
-    def test_process_mbox_files_shared_db(self, mock_get_connection, mock_makedirs, mock_clean_up, 
-                                         mock_parse_mbox, mock_join, mock_exists, mock_find_mbox):
+    def test_process_mbox_files_shared_db(self, mock_clean_up, mock_parse_rows, mock_find_mbox):
         """Test processing MBOX files with a shared database."""
         # Create mock paths
         mock_mbox_dir = "/path/to/mbox_dir"
         mock_db_path = os.path.join(self.output_dir, 'emaildb.sqlite3')
         
-        # Setup mock connections
-        mock_conn = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_get_connection.return_value = mock_conn
-        
-        # Mock os.path.exists to return True
-        mock_exists.return_value = True
-        
         # Mock find_all_mbox_files to return two mbox files
         mock_find_mbox.return_value = [
             f"{mock_mbox_dir}/subfolder1/file1.mbox",
             f"{mock_mbox_dir}/subfolder2/file2.mbox"
         ]
         
-        # Call the function with patched dependencies
-        main.process_mbox_files(mock_mbox_dir, mock_db_path, shared_db=True)
+        # Each worker returns the prepared rows for its file
+        def parse_rows(mbox_file, output_dir, source_pst):
+            return [prepare_email_data({
+                'subject': os.path.basename(mbox_file), 'sender_name': 'Sender',
+                'sender_email': 'sender@example.com', 'recipient_name': 'Recipient',
+                'recipient_email': 'recipient@example.com', 'attachment_filename': '',
+                'attachment_type': '', 'email_date': '2023-01-01', 'source_pst': source_pst
+            })]
+        mock_parse_rows.side_effect = parse_rows
         
-        # Verify get_db_connection was called with the correct path
-        mock_get_connection.assert_called_once_with(mock_db_path)
-        
-        # Verify parse_mbox_file was called for each mbox file
-        self.assertEqual(mock_parse_mbox.call_count, 2)
+        # Call the function with patched dependencies
+        main.process_mbox_files(mock_mbox_dir, mock_db_path, shared_db=True, max_workers=2)
         
-        # Check that parse_mbox_file was called with the right paths (using a less strict check)
-        # We'll verify that each expected filename appears in at least one of the calls
-        calls = [call[0] for call in mock_parse_mbox.call_args_list]
-        self.assertTrue(any("file1.mbox" in str(args[0]) for args in calls))
-        self.assertTrue(any("file2.mbox" in str(args[0]) for args in calls))
+        # Verify each mbox file was parsed with its directory and source PST
+        self.assertEqual(mock_parse_rows.call_count, 2)
+        mock_parse_rows.assert_any_call(
+            f"{mock_mbox_dir}/subfolder1/file1.mbox", f"{mock_mbox_dir}/subfolder1", "subfolder1.pst"
+        )
+        mock_parse_rows.assert_any_call(
+            f"{mock_mbox_dir}/subfolder2/file2.mbox", f"{mock_mbox_dir}/subfolder2", "subfolder2.pst"
+        )
         
-        # Verify source_pst values were used
-        self.assertTrue(any("subfolder1.pst" in str(args[3]) for args in calls))
-        self.assertTrue(any("subfolder2.pst" in str(args[3]) for args in calls))
+        # The rows from every worker were written to the shared database
+        self.assertEqual(get_email_count(mock_db_path), 2)
+        mock_clean_up.assert_called_once_with(mock_mbox_dir)
     
+    @patch('concurrent.futures.ProcessPoolExecutor', concurrent.futures.ThreadPoolExecutor)
     @patch('main.process_single_pst_mboxes')
     @patch('os.makedirs')
     @patch('os.path.exists')
@@ -245,19 +422,140 @@ class TestConversion(unittest.TestCase):
         # Verify process_single_pst_mboxes was called twice (once for each PST)
         self.assertEqual(mock_process_single.call_count, 2)
         
-        # Verify it was called with the correct arguments
+        # Verify it was called with the correct arguments; cores the two
+        # ingests leave idle are used for parsing
+        parse_workers = {'parse_workers': main.get_parse_workers(min(os.cpu_count() or 1, 2))}
         expected_calls = [
-            ((os.path.join(mock_mbox_dir, "test1"), os.path.join(mock_db_path, "test1.sqlite3"), False, "test1.pst"), {}),
-            ((os.path.join(mock_mbox_dir, "test2"), os.path.join(mock_db_path, "test2.sqlite3"), False, "test2.pst"), {})
+            ((os.path.join(mock_mbox_dir, "test1"), os.path.join(mock_db_path, "test1.sqlite3"), False, "test1.pst", None), parse_workers),
+            ((os.path.join(mock_mbox_dir, "test2"), os.path.join(mock_db_path, "test2.sqlite3"), False, "test2.pst", None), parse_workers)
         ]
         mock_process_single.assert_has_calls(expected_calls, any_order=True)
     
+    @patch('concurrent.futures.ProcessPoolExecutor', concurrent.futures.ThreadPoolExecutor)
+    @patch('main.process_single_pst_mboxes')
+    @patch('os.makedirs')
+    @patch('os.path.exists', return_value=True)
+    def test_process_mbox_files_per_pst_db_failure(self, mock_exists, mock_makedirs, mock_process_single):
+        """Test that one PST failing to ingest does not stop the others."""
+        def fail_first_pst(pst_mbox_dir, pst_db_path, keep_mbox, pst_file, mbox_files, parse_workers):
+            if pst_file == "test1.pst":
+                raise RuntimeError("ingest failed")
+        mock_process_single.side_effect = fail_first_pst
+        
+        main.process_mbox_files("/path/to/mbox_dir", "/path/to/db_dir",
+                                pst_files=["test1.pst", "test2.pst"], max_workers=2)
+        
+        self.assertEqual(mock_process_single.call_count, 2)
+    
+    @patch('concurrent.futures.ProcessPoolExecutor', concurrent.futures.ThreadPoolExecutor)
+    @patch('main.process_single_pst_mboxes')
+    @patch('main.pst_to_mbox')
+    def test_convert_and_ingest(self, mock_pst_to_mbox, mock_process_single):
+        """Test that each PST is ingested as soon as it is converted."""
+        db_dir = os.path.join(self.output_dir, 'db')
+        target_dir = self._make_target_dir('test1.pst', 'test2.pst', 'test3.pst')
+        os.makedirs(os.path.join(self.mbox_dir, 'test1'))
+        os.makedirs(os.path.join(self.mbox_dir, 'test3'))
+        
+        # test2 converts but produces no MBOX directory
+        test1_mbox = os.path.join(self.mbox_dir, 'test1', 'Inbox.mbox')
+        test3_mbox = os.path.join(self.mbox_dir, 'test3', 'Inbox.mbox')
+        def convert(target_dir, mbox_dir, max_workers, on_converted, pst_entries):
+            # The PST list is built once and handed to the conversion
+            self.assertEqual(sorted(entry.name for entry in pst_entries),
+                             ['test1.pst', 'test2.pst', 'test3.pst'])
+            on_converted('test1.pst', [test1_mbox], 2)
+            on_converted('test2.pst', [], 1)
+            on_converted('test3.pst', [test3_mbox], 0)
+            return ['test1.pst', 'test2.pst', 'test3.pst']
+        mock_pst_to_mbox.side_effect = convert
+        
+        result = main.convert_and_ingest(target_dir, self.mbox_dir, db_dir, False, 2)
+        
+        self.assertEqual(result, ['test1.pst', 'test2.pst', 'test3.pst'])
+        # The MBOX files reported by the conversion are passed straight on;
+        # only an ingest started after the last conversion parses in parallel
+        self.assertEqual(mock_process_single.call_args_list, [
+            call(os.path.join(self.mbox_dir, 'test1'), os.path.join(db_dir, 'test1.sqlite3'),
+                               False, 'test1.pst', [test1_mbox], parse_workers=1),
+            call(os.path.join(self.mbox_dir, 'test3'), os.path.join(db_dir, 'test3.sqlite3'),
+                               False, 'test3.pst', [test3_mbox], parse_workers=main.get_parse_workers(2))
+        ])
+    
+    def test_process_single_pst_mboxes_parallel_parse(self):
+        """Test parsing one PST's MBOX files in several processes."""
+        db_file = os.path.join(self.output_dir, 'test1.sqlite3')
+        pst_mbox_dir = os.path.join(self.mbox_dir, 'test1')
+        mbox_files = []
+        for folder, message_count in (('Inbox', 2), ('Sent', 3)):
+            os.makedirs(os.path.join(pst_mbox_dir, folder))
+            mbox_file = os.path.join(pst_mbox_dir, folder, 'mbox.mbox')
+            mbox = mailbox.mbox(mbox_file)
+            for i in range(message_count):
+                message = email.message.EmailMessage()
+                message['Subject'] = f'{folder} {i}'
+                message['From'] = 'Sender <sender@example.com>'
+                message['To'] = 'Recipient <recipient@example.com>'
+                message.set_content('body')
+                mbox.add(message)
+            mbox.close()
+            mbox_files.append(mbox_file)
+        
+        main.process_single_pst_mboxes(pst_mbox_dir, db_file, True, 'test1.pst', mbox_files, parse_workers=2)
+        
+        self.assertEqual(get_email_count(db_file), 5)
+    
+    @patch('main.MIN_SPLIT_BYTES', 1)
+    def test_process_single_pst_mboxes_splits_large_mbox(self):
+        """Test parsing a single large MBOX file in byte ranges."""
+        db_file = os.path.join(self.output_dir, 'test1.sqlite3')
+        pst_mbox_dir = os.path.join(self.mbox_dir, 'test1')
+        os.makedirs(os.path.join(pst_mbox_dir, 'Inbox'))
+        mbox_file = os.path.join(pst_mbox_dir, 'Inbox', 'mbox.mbox')
+        mbox = mailbox.mbox(mbox_file)
+        for i in range(6):
+            message = email.message.EmailMessage()
+            message['Subject'] = f'Inbox {i}'
+            message['From'] = 'Sender <sender@example.com>'
+            message['To'] = 'Recipient <recipient@example.com>'
+            message.set_content('body')
+            mbox.add(message)
+        mbox.close()
+        
+        parse_tasks = main.split_parse_tasks([(mbox_file, pst_mbox_dir, 'test1.pst')], 3)
+        self.assertEqual(len(parse_tasks), 3)
+        self.assertEqual(parse_tasks[0][:3], (mbox_file, pst_mbox_dir, 'test1.pst'))
+        
+        main.process_single_pst_mboxes(pst_mbox_dir, db_file, True, 'test1.pst', [mbox_file], parse_workers=3)
+        
+        self.assertEqual(get_email_count(db_file), 6)
+    
+    def test_process_with_separate_dbs_in_processes(self):
+        """Test ingesting real MBOX files in worker processes."""
+        db_dir = os.path.join(self.output_dir, 'db')
+        for pst_name, message_count in (('test1', 2), ('test2', 3)):
+            os.makedirs(os.path.join(self.mbox_dir, pst_name, 'Inbox'))
+            mbox = mailbox.mbox(os.path.join(self.mbox_dir, pst_name, 'Inbox', 'Inbox.mbox'))
+            for i in range(message_count):
+                message = email.message.EmailMessage()
+                message['Subject'] = f'Message {i}'
+                message['From'] = 'Sender <sender@example.com>'
+                message['To'] = 'Recipient <recipient@example.com>'
+                message['Date'] = 'Mon, 02 Jan 2023 10:00:00 +0000'
+                message.set_content('body')
+                mbox.add(message)
+            mbox.close()
+        
+        main.process_with_separate_dbs(self.mbox_dir, db_dir, True, ['test1.pst', 'test2.pst'], 2)
+        
+        self.assertEqual(get_email_count(os.path.join(db_dir, 'test1.sqlite3')), 2)
+        self.assertEqual(get_email_count(os.path.join(db_dir, 'test2.sqlite3')), 3)
+    
     @patch('main.collect_conversion_statistics')
     @patch('main.display_conversion_summary')
-    @patch('main.process_mbox_files')
-    @patch('main.pst_to_mbox')
+    @patch('main.convert_and_ingest')
     @patch('argparse.ArgumentParser.parse_args')
-    def test_main_function_per_pst_db(self, mock_args, mock_pst_to_mbox, mock_process, 
+    def test_main_function_per_pst_db(self, mock_args, mock_convert_and_ingest, 
                                      mock_display_summary, mock_collect_stats):
         """Test the main function with separate database per PST (default)."""
         # Mock command line args
@@ -271,7 +569,7 @@ class TestConversion(unittest.TestCase):
         mock_args.return_value = args
         
         # Mock successful conversion
-        mock_pst_to_mbox.return_value = ['test1.pst', 'test2.pst']
+        mock_convert_and_ingest.return_value = ['test1.pst', 'test2.pst']
         
         # Mock statistics collection
         mock_collect_stats.return_value = {'total_emails': 10}
@@ -279,16 +577,13 @@ class TestConversion(unittest.TestCase):
         # Run the main function
         main.main()
         
-        # Verify pst_to_mbox was called
-        mock_pst_to_mbox.assert_called_once_with(self.target_dir, self.mbox_dir, 2)
-        
-        # Verify process_mbox_files was called correctly (default is per-PST databases)
-        mock_process.assert_called_once_with(
+        # Verify conversion and per-PST ingest run as one pipeline (the default)
+        mock_convert_and_ingest.assert_called_once_with(
+            self.target_dir,
             self.mbox_dir,
             os.path.join(self.output_dir, 'db'),
             False,  # keep_mbox
-            False,  # shared_db (default is false)
-            ['test1.pst', 'test2.pst']
+            2  # max_workers
         )
         
         # Verify statistics functions were called
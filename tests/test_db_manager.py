@@ -2,15 +2,22 @@ import unittest
 import os
 import sqlite3
 import tempfile
+import threading
 from unittest.mock import patch, MagicMock, mock_open
 
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db_manager import (
-    create_db, store_data, get_email_count, get_email_stats,
+    create_db, store_data, store_data_batch, get_email_count, get_email_stats,
+    get_combined_email_stats,
+    get_multi_row_insert_sql, get_max_host_parameters,
     DatabaseError, DatabaseConnectionError, DatabaseCreationError, 
-    DatabaseWriteError, InvalidDataError, get_db_connection
+    DatabaseWriteError, InvalidDataError, get_db_connection,
+    close_all_connections, close_connection, insert_email_rows, transaction,
+    tune_connection,
+    create_table, create_indexes, drop_indexes, insert_one, prepare_email_data,
+    ReadOnlyPool, query_emails, validate_email_data, EMAIL_INDEXES, EMAIL_STATS_QUERIES
 )
 
 class TestDBManager(unittest.TestCase):
@@ -25,6 +32,9 @@ class TestDBManager(unittest.TestCase):
             os.remove(self.test_db)
     
     def tearDown(self):
+        # Close cached connections before removing their database files
+        close_all_connections()
+        
         # Remove the test database
         if os.path.exists(self.test_db):
             os.remove(self.test_db)
@@ -43,15 +53,12 @@ class TestDBManager(unittest.TestCase):
     @patch('db_manager.get_db_connection')
     def test_create_db(self, mock_get_connection):
         # Setup mock connection and cursor
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
+        mock_conn = MagicMock(spec_set=sqlite3.Connection)
+        mock_cursor = MagicMock(spec_set=sqlite3.Cursor)
         mock_conn.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_get_connection.return_value = mock_conn
         
-        # Setup cursor for verification query
-        mock_cursor.fetchone.return_value = ['emails']
-        
         # Test database creation
         self.assertTrue(create_db(self.test_db))
         
@@ -59,10 +66,12 @@ class TestDBManager(unittest.TestCase):
         mock_get_connection.assert_called_once_with(self.test_db)
         
         # Verify CREATE TABLE was executed 
-        mock_cursor.execute.assert_any_call("SELECT name FROM sqlite_master WHERE type='table' AND name='emails'")
+        executed = [call[0][0] for call in mock_cursor.execute.call_args_list]
+        self.assertIn('CREATE TABLE IF NOT EXISTS emails', executed[0])
         
-        # Verify indexes were created
+        # Verify indexes were created and the schema is not queried back
         self.assertGreaterEqual(mock_cursor.execute.call_count, 5)  # At least 5 calls (1 table + 4 indexes)
+        self.assertFalse(any('sqlite_master' in statement for statement in executed))
     
     @patch('db_manager.get_db_connection')
     def test_create_db_error(self, mock_get_connection):
@@ -73,6 +82,22 @@ class TestDBManager(unittest.TestCase):
         with self.assertRaises(DatabaseCreationError):
             create_db(self.test_db)
     
+    def test_create_table_defers_indexes(self):
+        # Create the table without secondary indexes
+        self.assertTrue(create_table(self.test_db))
+        
+        index_query = "SELECT COUNT(*) FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"
+        with get_db_connection(self.test_db) as conn:
+            self.assertEqual(conn.execute(index_query).fetchone()[0], 0)
+            
+            # Indexes are built on demand after the load
+            create_indexes(conn)
+            self.assertEqual(conn.execute(index_query).fetchone()[0], len(EMAIL_INDEXES))
+            
+            # And can be dropped again before the next load
+            drop_indexes(conn)
+            self.assertEqual(conn.execute(index_query).fetchone()[0], 0)
+    
     def test_store_data_integration(self):
         """Integration test for store_data function"""
         # Create the actual database
@@ -97,7 +122,7 @@ class TestDBManager(unittest.TestCase):
         # Check if the data was stored correctly
         with sqlite3.connect(self.test_db) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM emails")
+            cursor.execute("SELECT * FROM email_details")
             row = cursor.fetchone()
             
             # Check each field (skipping the ID which is auto-generated)
@@ -111,6 +136,116 @@ class TestDBManager(unittest.TestCase):
             self.assertEqual(row[8], test_data['email_date'])
             self.assertEqual(row[9], test_data['source_pst'])
     
+    def test_attachment_types_stored_once(self):
+        create_db(self.test_db)
+        
+        with get_db_connection(self.test_db) as conn:
+            inserted = insert_email_rows(conn, [
+                self._email(attachment_type='application/pdf'),
+                self._email(attachment_type='application/pdf'),
+                self._email(attachment_filename='', attachment_type='')
+            ])
+            conn.commit()
+            self.assertEqual(inserted, 3)
+            
+            self.assertEqual(
+                conn.execute("SELECT name FROM attachment_types").fetchall(),
+                [('application/pdf',)]
+            )
+            # Only records that carry an attachment get an attachment row
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0], 2)
+        
+        types = [row['attachment_type'] for row in query_emails(self.test_db, columns=['attachment_type'])]
+        self.assertEqual(sorted(types), ['', 'application/pdf', 'application/pdf'])
+    
+    def test_create_db_migrates_text_attachment_types(self):
+        # A database written before attachment types moved to a lookup table
+        with sqlite3.connect(self.test_db) as conn:
+            conn.execute('''
+            CREATE TABLE emails (
+                id INTEGER PRIMARY KEY, subject TEXT, sender_name TEXT,
+                sender_email TEXT, recipient_name TEXT, recipient_email TEXT,
+                attachment_filename TEXT, attachment_type TEXT,
+                email_date TEXT, source_pst TEXT
+            )''')
+            conn.execute("CREATE INDEX idx_sender_email ON emails(sender_email)")
+            conn.execute(
+                "INSERT INTO emails VALUES (7, 'Old', 'A', 'a@example.com', 'B', "
+                "'b@example.com', 'old.txt', 'text/plain', '2020-01-01', 'old.pst')"
+            )
+        
+        create_db(self.test_db)
+        
+        rows = query_emails(self.test_db)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], 7)
+        self.assertEqual(rows[0]['attachment_type'], 'text/plain')
+        self.assertEqual(get_email_stats(self.test_db)['attachment_types'], {'text/plain': 1})
+        
+        with get_db_connection(self.test_db) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertNotIn('emails_legacy', tables)
+            index_count = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+            ).fetchone()[0]
+            self.assertEqual(index_count, len(EMAIL_INDEXES))
+    
+    def test_create_db_migrates_flat_emails(self):
+        # A database with one emails row per attachment and the email_details view
+        with sqlite3.connect(self.test_db) as conn:
+            conn.execute("CREATE TABLE attachment_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+            conn.execute(
+                "CREATE TABLE emails (id INTEGER PRIMARY KEY, subject TEXT, sender_name TEXT, "
+                "sender_email TEXT, recipient_name TEXT, recipient_email TEXT, attachment_filename TEXT, "
+                "attachment_type_id INTEGER REFERENCES attachment_types(id), email_date TEXT, source_pst TEXT)"
+            )
+            conn.execute(
+                "CREATE VIEW email_details AS SELECT e.*, t.name AS attachment_type FROM emails e "
+                "LEFT JOIN attachment_types t ON t.id = e.attachment_type_id"
+            )
+            conn.execute("INSERT INTO attachment_types VALUES (4, 'application/pdf')")
+            conn.execute(
+                "INSERT INTO emails VALUES (3, 'Old', 'A', 'a@example.com', 'B', "
+                "'b@example.com', 'old.pdf', 4, '2021-01-01', 'old.pst')"
+            )
+            conn.execute(
+                "INSERT INTO emails VALUES (5, 'Plain', 'A', 'a@example.com', 'B', "
+                "'b@example.com', '', NULL, '2021-01-02', 'old.pst')"
+            )
+        conn.close()
+        
+        create_db(self.test_db)
+        
+        rows = query_emails(self.test_db, columns=['id', 'attachment_filename', 'attachment_type'])
+        self.assertEqual(sorted((row['id'], row['attachment_filename'], row['attachment_type']) for row in rows),
+                         [(3, 'old.pdf', 'application/pdf'), (5, '', '')])
+        self.assertEqual(get_email_stats(self.test_db)['emails_with_attachments'], 1)
+    
+    def test_create_db_migrates_mytable(self):
+        # The original schema kept fewer columns in a table called mytable
+        with sqlite3.connect(self.test_db) as conn:
+            conn.execute(
+                "CREATE TABLE mytable (subject TEXT, sender_name TEXT, sender_email TEXT, "
+                "recipient_name TEXT, recipient_email TEXT, attachment_filename TEXT, "
+                "attachment_type TEXT, email_date TEXT)"
+            )
+            conn.execute(
+                "INSERT INTO mytable VALUES ('Old', 'A', 'a@example.com', 'B', "
+                "'b@example.com', '', '', '2019-01-01')"
+            )
+        
+        create_db(self.test_db)
+        
+        rows = query_emails(self.test_db)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['subject'], 'Old')
+        self.assertEqual(rows[0]['attachment_type'], '')
+        self.assertIsNone(rows[0]['source_pst'])
+        
+        with get_db_connection(self.test_db) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertNotIn('mytable', tables)
+    
     def test_store_data_missing_keys(self):
         # Create the database
         create_db(self.test_db)
@@ -167,11 +302,229 @@ class TestDBManager(unittest.TestCase):
             row = cursor.fetchone()
             self.assertEqual(row[0], '')  # Empty source_pst field
     
+    def test_store_data_rolls_back_partial_email(self):
+        # Create the database
+        create_db(self.test_db)
+        
+        # A failing attachment insert leaves no email row behind
+        record = self._email(attachment_filename='test.txt', attachment_type='text/plain')
+        with patch('db_manager.INSERT_ATTACHMENT_SQL', 'INSERT INTO missing_table VALUES (?, ?, ?)'):
+            self.assertFalse(store_data(record, self.test_db))
+        self.assertEqual(get_email_count(self.test_db), 0)
+        
+        self.assertTrue(store_data(record, self.test_db))
+        self.assertEqual(get_email_count(self.test_db), 1)
+    
+    def test_store_data_batch(self):
+        # Create the database
+        create_db(self.test_db)
+        
+        test_data = {
+            'subject': 'Test Subject',
+            'sender_name': 'Sender Name',
+            'sender_email': 'sender@example.com',
+            'recipient_name': 'Recipient Name',
+            'recipient_email': 'recipient@example.com',
+            'attachment_filename': '',
+            'attachment_type': '',
+            'email_date': '2023-01-01T12:00:00',
+            'source_pst': 'test.pst'
+        }
+        
+        # Five valid rows split across multi-row batches plus one invalid row
+        data_list = [test_data] * 5 + [{'subject': 'Incomplete'}]
+        successful, failed = store_data_batch(data_list, self.test_db, batch_size=2)
+        
+        self.assertEqual((successful, failed), (5, 1))
+        self.assertEqual(get_email_count(self.test_db), 5)
+    
+    def test_validate_email_data(self):
+        # Complete records pass, with or without source_pst
+        validate_email_data(self._email())
+        record = self._email()
+        del record['source_pst']
+        validate_email_data(record)
+        
+        # Missing keys are named in the error
+        with self.assertRaises(InvalidDataError) as context:
+            validate_email_data({'subject': 'Test Subject'})
+        self.assertIn('sender_email', str(context.exception))
+        self.assertNotIn('subject,', str(context.exception))
+    
+    def test_prepare_email_data(self):
+        from email.header import Header
+        
+        # Strings pass through, missing or empty values become ''
+        row = prepare_email_data({
+            'subject': Header('Encoded Subject'),
+            'sender_name': 'Sender Name',
+            'sender_email': None
+        })
+        
+        self.assertEqual(len(row), 10)
+        self.assertEqual(row[0], 'Encoded Subject')
+        self.assertEqual(row[1], 'Sender Name')
+        self.assertTrue(all(value == '' for value in row[2:9]))
+        self.assertTrue(row[9])
+        
+        # Complete string records map straight onto the column order
+        row = prepare_email_data(self._email(subject='Plain Subject'))
+        self.assertEqual(row, (
+            'Plain Subject', 'Sender Name', 'sender@example.com', 'Recipient Name',
+            'recipient@example.com', '', '', '2023-01-01T12:00:00', 'test1.pst', True
+        ))
+        
+        # Complete records with a non-string value still get converted
+        row = prepare_email_data(self._email(subject=Header('Header Subject'), source_pst=None))
+        self.assertEqual(row[0], 'Header Subject')
+        self.assertEqual(row[8], '')
+    
+    def test_transaction_commits_and_rolls_back(self):
+        # Create the database
+        create_db(self.test_db)
+        
+        insert_sql = "INSERT INTO emails (subject) VALUES (?)"
+        
+        with get_db_connection(self.test_db) as conn:
+            # A clean exit commits the transaction
+            with transaction(conn):
+                conn.execute(insert_sql, ('Kept',))
+            
+            # An exception rolls the transaction back and propagates
+            with self.assertRaises(ValueError):
+                with transaction(conn):
+                    conn.execute(insert_sql, ('Discarded',))
+                    raise ValueError("Test error")
+            
+            self.assertFalse(conn.in_transaction)
+            
+            # So does an interrupt, which isn't an Exception subclass
+            with self.assertRaises(KeyboardInterrupt):
+                with transaction(conn):
+                    conn.execute(insert_sql, ('Interrupted',))
+                    raise KeyboardInterrupt
+            
+            self.assertFalse(conn.in_transaction)
+            
+            # A COMMIT that fails (here on a deferred foreign key check) is
+            # rolled back too, leaving the connection usable
+            with self.assertRaises(sqlite3.IntegrityError):
+                with transaction(conn):
+                    conn.execute("PRAGMA defer_foreign_keys=ON")
+                    conn.execute("INSERT INTO attachments (email_id, filename) VALUES (999, 'orphan.pdf')")
+            
+            self.assertFalse(conn.in_transaction)
+            with transaction(conn):
+                pass
+        
+        self.assertEqual(get_email_count(self.test_db), 1)
+    
+    def test_get_max_host_parameters(self):
+        # SQLite raised its default limit from 999 in version 3.32
+        self.assertEqual(get_max_host_parameters((3, 31, 1)), 999)
+        self.assertEqual(get_max_host_parameters((3, 32, 0)), 32766)
+        self.assertEqual(get_max_host_parameters((3, 45, 1)), 32766)
+    
+    def test_store_data_batch_with_old_parameter_limit(self):
+        create_db(self.test_db)
+        
+        # A requested batch is split to fit a library that only allows 999
+        # parameters (Connection.setlimit needs Python 3.11)
+        with get_db_connection(self.test_db) as conn:
+            if hasattr(conn, 'setlimit'):
+                conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        with patch('db_manager.SQLITE_MAX_VARS', 999):
+            successful, failed = store_data_batch([self._email()] * 300, self.test_db, batch_size=300)
+        
+        self.assertEqual((successful, failed), (300, 0))
+        self.assertEqual(get_email_count(self.test_db), 300)
+    
+    def test_get_multi_row_insert_sql(self):
+        # One placeholder group per row
+        sql = get_multi_row_insert_sql(3)
+        self.assertEqual(sql.count('(?, ?, ?, ?, ?, ?, ?, ?)'), 3)
+        
+        # Statements are memoised per row count
+        self.assertIs(get_multi_row_insert_sql(3), sql)
+    
+    def test_get_db_connection_new_database_page_size(self):
+        # New databases are created with the tuned page size and cache
+        with get_db_connection(self.test_db) as conn:
+            conn.execute("CREATE TABLE sample (id INTEGER PRIMARY KEY)")
+            self.assertEqual(conn.execute("PRAGMA page_size").fetchone()[0], 8192)
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -20000)
+    
+    def test_get_db_connection_bulk_load(self):
+        create_table(self.test_db)
+        
+        # Bulk loads relax journaling and syncing for the duration of the block
+        with get_db_connection(self.test_db, bulk_load=True) as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'memory')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 0)
+            with transaction(conn):
+                conn.execute("INSERT INTO emails (subject) VALUES (?)", ('Bulk',))
+        
+        # The regular settings are restored afterwards
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(conn.execute("PRAGMA locking_mode").fetchone()[0], 'normal')
+        
+        # Other connections can read the loaded data
+        with sqlite3.connect(self.test_db) as other_conn:
+            self.assertEqual(other_conn.execute("SELECT subject FROM emails").fetchall(), [('Bulk',)])
+        other_conn.close()
+    
+    def test_get_db_connection_upgrades_legacy_page_size(self):
+        # Create a database with the old 1 KB page size
+        with sqlite3.connect(self.test_db) as legacy_conn:
+            legacy_conn.execute("PRAGMA page_size=1024")
+            legacy_conn.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        legacy_conn.close()
+        
+        # Opening it through get_db_connection rebuilds it with larger pages
+        with get_db_connection(self.test_db) as conn:
+            self.assertEqual(conn.execute("PRAGMA page_size").fetchone()[0], 8192)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertGreater(conn.execute("PRAGMA mmap_size").fetchone()[0], 0)
+    
+    def test_insert_email_rows(self):
+        # Create the database
+        create_db(self.test_db)
+        
+        test_data = {
+            'subject': 'Test Subject',
+            'sender_name': 'Sender Name',
+            'sender_email': 'sender@example.com',
+            'recipient_name': 'Recipient Name',
+            'recipient_email': 'recipient@example.com',
+            'attachment_filename': '',
+            'attachment_type': '',
+            'email_date': '2023-01-01T12:00:00',
+            'source_pst': 'test.pst'
+        }
+        
+        # Insert several rows inside one caller-owned transaction
+        with get_db_connection(self.test_db) as conn:
+            conn.execute('BEGIN TRANSACTION')
+            self.assertEqual(insert_email_rows(conn, [test_data] * 3), 3)
+            conn.commit()
+        
+        self.assertEqual(get_email_count(self.test_db), 3)
+        
+        # Single prepared rows go through the same cached statement
+        with get_db_connection(self.test_db) as conn:
+            insert_one(conn, prepare_email_data(test_data))
+        
+        self.assertEqual(get_email_count(self.test_db), 4)
+        
+        # An empty batch is a no-op
+        with get_db_connection(self.test_db) as conn:
+            self.assertEqual(insert_email_rows(conn, []), 0)
+    
     @patch('db_manager.get_db_connection')
     def test_get_email_count(self, mock_get_connection):
         # Setup mock connection and cursor
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
+        mock_conn = MagicMock(spec_set=sqlite3.Connection)
+        mock_cursor = MagicMock(spec_set=sqlite3.Cursor)
         mock_conn.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_get_connection.return_value = mock_conn
@@ -191,51 +544,225 @@ class TestDBManager(unittest.TestCase):
         # Verify query was executed
         mock_cursor.execute.assert_called_once_with("SELECT COUNT(*) FROM emails")
     
-    @patch('db_manager.get_db_connection')
-    def test_get_email_stats(self, mock_get_connection):
-        # Setup mock connection and cursor
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.__enter__.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-        mock_get_connection.return_value = mock_conn
+    def _email(self, **overrides):
+        """Build a complete email record for tests."""
+        data = {
+            'subject': 'Test Subject',
+            'sender_name': 'Sender Name',
+            'sender_email': 'sender@example.com',
+            'recipient_name': 'Recipient Name',
+            'recipient_email': 'recipient@example.com',
+            'attachment_filename': '',
+            'attachment_type': '',
+            'email_date': '2023-01-01T12:00:00',
+            'source_pst': 'test1.pst'
+        }
+        data.update(overrides)
+        return data
+    
+    def test_get_email_stats(self):
+        create_db(self.test_db)
         
-        # Setup cursor for query results
-        mock_cursor.fetchone.side_effect = [
-            [100],  # total_emails
-            [50],   # emails_with_attachments
-            [25],   # unique_senders
-            [30]    # unique_recipients
-        ]
-        mock_cursor.fetchall.side_effect = [
-            [('test1.pst',), ('test2.pst',)],  # pst_files
-            [('application/pdf', 20), ('image/jpeg', 15)]  # attachment_types
-        ]
+        store_data_batch([
+            self._email(attachment_filename='a.pdf', attachment_type='application/pdf'),
+            self._email(attachment_filename='b.pdf', attachment_type='application/pdf',
+                        sender_email='other@example.com'),
+            self._email(attachment_filename='c.jpg', attachment_type='image/jpeg',
+                        source_pst='test2.pst'),
+            self._email(recipient_email='second@example.com', source_pst='test2.pst'),
+            self._email(source_pst='')
+        ], self.test_db)
         
         # Test get_email_stats function
         stats = get_email_stats(self.test_db)
         
         # Verify results
         expected_stats = {
-            'total_emails': 100,
-            'emails_with_attachments': 50,
-            'unique_senders': 25,
-            'unique_recipients': 30,
+            'total_emails': 5,
+            'emails_with_attachments': 3,
+            'unique_senders': 2,
+            'unique_recipients': 2,
             'pst_files': ['test1.pst', 'test2.pst'],
             'attachment_types': {
-                'application/pdf': 20,
-                'image/jpeg': 15
+                'application/pdf': 2,
+                'image/jpeg': 1
             }
         }
         
-        # Check stats match expected values
+        stats['pst_files'].sort()
         self.assertEqual(stats, expected_stats)
+        self.assertEqual(list(stats['attachment_types']), ['application/pdf', 'image/jpeg'])
+    
+    def test_query_emails_columns(self):
+        create_db(self.test_db)
+        store_data_batch([
+            self._email(subject='Older', email_date='2023-01-01'),
+            self._email(subject='Newer', email_date='2023-02-01',
+                        attachment_filename='a.pdf', attachment_type='application/pdf')
+        ], self.test_db)
         
-        # Verify connection was established
-        mock_get_connection.assert_called_once_with(self.test_db)
+        # Only the requested columns are returned
+        results = query_emails(self.test_db, columns=['subject', 'email_date'])
+        self.assertEqual(results, [
+            {'subject': 'Newer', 'email_date': '2023-02-01'},
+            {'subject': 'Older', 'email_date': '2023-01-01'}
+        ])
+        
+        # Filters still apply
+        results = query_emails(self.test_db, with_attachments=True, columns=['subject'])
+        self.assertEqual(results, [{'subject': 'Newer'}])
+        
+        # Column names are whitelisted
+        with self.assertRaises(InvalidDataError):
+            query_emails(self.test_db, columns=['subject FROM emails; --'])
+    
+    def test_email_details_join_uses_index(self):
+        create_db(self.test_db)
+        
+        with get_db_connection(self.test_db) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM email_details WHERE 1=1 "
+                "AND attachment_filename != '' ORDER BY email_date DESC LIMIT 10"
+            ).fetchall()
+        
+        self.assertIn('idx_attachment_email', ' '.join(str(row) for row in plan))
+    
+    def test_email_stats_queries_use_indexes(self):
+        create_db(self.test_db)
+        
+        with get_db_connection(self.test_db) as conn:
+            plans = {
+                name: ' '.join(str(row) for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+                for name, query in EMAIL_STATS_QUERIES.items()
+            }
+        
+        self.assertIn('idx_sender_email', plans['totals'])
+        self.assertIn('idx_recipient_email', plans['totals'])
+        self.assertIn('idx_attachment_type', plans['attachment_types'])
+    
+    def test_email_stored_once_per_message(self):
+        create_db(self.test_db)
+        
+        # One message with two attachments, then a message without any
+        with get_db_connection(self.test_db) as conn:
+            with transaction(conn):
+                inserted = insert_email_rows(conn, [
+                    self._email(attachment_filename='a.pdf', attachment_type='application/pdf'),
+                    self._email(attachment_filename='b.jpg', attachment_type='image/jpeg',
+                                new_email=False),
+                    self._email()
+                ])
+            self.assertEqual(inserted, 3)
+            self.assertEqual(
+                conn.execute("SELECT email_id, filename FROM attachments ORDER BY id").fetchall(),
+                [(1, 'a.pdf'), (1, 'b.jpg')]
+            )
         
-        # Verify queries were executed (6 total)
-        self.assertEqual(mock_cursor.execute.call_count, 6)
+        self.assertEqual(get_email_count(self.test_db), 2)
+        rows = query_emails(self.test_db, columns=['id', 'attachment_filename'])
+        self.assertEqual(sorted((row['id'], row['attachment_filename']) for row in rows),
+                         [(1, 'a.pdf'), (1, 'b.jpg'), (2, '')])
+        
+        stats = get_email_stats(self.test_db)
+        self.assertEqual(stats['total_emails'], 2)
+        self.assertEqual(stats['emails_with_attachments'], 1)
+        self.assertEqual(stats['attachment_types'], {'application/pdf': 1, 'image/jpeg': 1})
+    
+    def test_identical_messages_stored_separately(self):
+        create_db(self.test_db)
+        
+        # Two messages with the same fields, each with its own attachment
+        with get_db_connection(self.test_db) as conn:
+            with transaction(conn):
+                insert_email_rows(conn, [
+                    self._email(attachment_filename='a.pdf', attachment_type='application/pdf'),
+                    self._email(attachment_filename='a.pdf', attachment_type='application/pdf')
+                ])
+            self.assertEqual(
+                conn.execute("SELECT email_id, filename FROM attachments ORDER BY id").fetchall(),
+                [(1, 'a.pdf'), (2, 'a.pdf')]
+            )
+        
+        self.assertEqual(get_email_count(self.test_db), 2)
+    
+    def test_store_data_batch_keeps_email_attachments_together(self):
+        create_db(self.test_db)
+        
+        # An email with three attachments spans the batch boundary
+        records = [self._email(subject='First', attachment_filename=name,
+                               attachment_type='application/pdf', new_email=name == 'a.pdf')
+                   for name in ('a.pdf', 'b.pdf', 'c.pdf')]
+        records.append(self._email(subject='Second'))
+        
+        successful, failed = store_data_batch(records, self.test_db, batch_size=2)
+        self.assertEqual((successful, failed), (4, 0))
+        
+        self.assertEqual(get_email_count(self.test_db), 2)
+        with get_db_connection(self.test_db) as conn:
+            self.assertEqual(
+                conn.execute("SELECT email_id, filename FROM attachments ORDER BY id").fetchall(),
+                [(1, 'a.pdf'), (1, 'b.pdf'), (1, 'c.pdf')]
+            )
+            self.assertEqual(conn.execute("SELECT id, subject FROM emails ORDER BY id").fetchall(),
+                             [(1, 'First'), (2, 'Second')])
+    
+    def test_get_email_stats_missing_database(self):
+        # A missing database yields empty statistics without creating the file
+        missing_db = os.path.join(self.test_dir, 'missing.sqlite3')
+        stats = get_email_stats(missing_db)
+        
+        self.assertEqual(stats['total_emails'], 0)
+        self.assertEqual(stats['attachment_types'], {})
+        self.assertFalse(os.path.exists(missing_db))
+    
+    def test_get_email_stats_empty_database(self):
+        create_db(self.test_db)
+        
+        # Aggregates over an empty table are zero rather than NULL
+        stats = get_email_stats(self.test_db)
+        
+        self.assertEqual(stats['total_emails'], 0)
+        self.assertEqual(stats['emails_with_attachments'], 0)
+        self.assertEqual(stats['pst_files'], [])
+    
+    def test_get_combined_email_stats(self):
+        second_db = os.path.join(self.test_dir, 'second.sqlite3')
+        create_db(self.test_db)
+        create_db(second_db)
+        
+        store_data_batch([
+            self._email(attachment_filename='a.pdf', attachment_type='application/pdf'),
+            self._email(sender_email='other@example.com')
+        ], self.test_db)
+        store_data_batch([
+            self._email(attachment_filename='b.pdf', attachment_type='application/pdf',
+                        source_pst='test2.pst'),
+            self._email(recipient_email='second@example.com', source_pst='test2.pst')
+        ], second_db)
+        
+        # Senders shared between databases are counted once; missing files are skipped
+        stats = get_combined_email_stats(
+            [self.test_db, second_db, os.path.join(self.test_dir, 'missing.sqlite3')]
+        )
+        
+        self.assertEqual(stats['total_emails'], 4)
+        self.assertEqual(stats['emails_with_attachments'], 2)
+        self.assertEqual(stats['unique_senders'], 2)
+        self.assertEqual(stats['unique_recipients'], 2)
+        self.assertEqual(sorted(stats['pst_files']), ['test1.pst', 'test2.pst'])
+        self.assertEqual(stats['attachment_types'], {'application/pdf': 2})
+        close_connection(second_db)
+    
+    def test_read_only_pool(self):
+        create_db(self.test_db)
+        
+        with ReadOnlyPool(self.test_db, size=2) as pool:
+            self.assertEqual(pool.fetchall("SELECT COUNT(*) FROM emails"), [(0,)])
+            
+            # Pooled connections cannot write
+            with pool.connection() as conn:
+                with self.assertRaises(sqlite3.OperationalError):
+                    conn.execute("INSERT INTO emails (subject) VALUES ('x')")
     
     @patch('os.makedirs')
     def test_get_db_connection_creates_directory(self, mock_makedirs):
@@ -252,6 +779,91 @@ class TestDBManager(unittest.TestCase):
         
         # Verify the directory was created
         mock_makedirs.assert_called_once_with(dir_path, exist_ok=True)
+    
+    def test_get_db_connection_reuses_connection(self):
+        # Test that repeated calls for the same path share one connection
+        with get_db_connection(self.test_db) as first_conn:
+            pass
+        with get_db_connection(self.test_db) as second_conn:
+            pass
+        
+        self.assertIs(first_conn, second_conn)
+        
+        # The connection stays usable after the context exits
+        self.assertEqual(second_conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        
+        # Closing the cache forces a fresh connection on the next call
+        close_all_connections()
+        with get_db_connection(self.test_db) as third_conn:
+            pass
+        
+        self.assertIsNot(first_conn, third_conn)
+    
+    def test_store_data_concurrent_threads(self):
+        # Threads writing to one database each get their own connection, so
+        # their transactions never interleave on a shared handle
+        create_db(self.test_db)
+        barrier = threading.Barrier(4)
+        results = {}
+        
+        def store_many(thread_index):
+            with get_db_connection(self.test_db) as conn:
+                pass
+            barrier.wait()
+            stored = sum(store_data(self._email(subject=f'Thread {thread_index} email {i}'), self.test_db)
+                         for i in range(50))
+            results[thread_index] = (conn, stored)
+        
+        threads = [threading.Thread(target=store_many, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual([stored for _, stored in results.values()], [50] * 4)
+        self.assertEqual(len({id(conn) for conn, _ in results.values()}), 4)
+        self.assertEqual(get_email_count(self.test_db), 200)
+    
+    def test_get_db_connection_cached_skips_directory_check(self):
+        nested_db = os.path.join(self.test_dir, 'nested', 'emails.sqlite3')
+        with get_db_connection(nested_db):
+            pass
+        self.assertTrue(os.path.isdir(os.path.dirname(nested_db)))
+        
+        # A cached connection is returned without checking the directory again
+        with patch('os.path.exists') as mock_exists:
+            with get_db_connection(nested_db):
+                pass
+        mock_exists.assert_not_called()
+    
+    def test_close_connection(self):
+        other_db = os.path.join(self.test_dir, 'other.sqlite3')
+        with get_db_connection(self.test_db) as first_conn:
+            pass
+        with get_db_connection(other_db) as other_conn:
+            pass
+        
+        close_connection(self.test_db)
+        
+        # Only the named database's connection is closed and forgotten
+        with self.assertRaises(sqlite3.ProgrammingError):
+            first_conn.execute("SELECT 1")
+        with get_db_connection(self.test_db) as reopened_conn:
+            self.assertIsNot(reopened_conn, first_conn)
+        with get_db_connection(other_db) as same_conn:
+            self.assertIs(same_conn, other_conn)
+        
+        # Closing a path that has no cached connection is a no-op
+        close_connection(os.path.join(self.test_dir, 'missing.sqlite3'))
+    
+    def test_tune_connection(self):
+        conn = tune_connection(sqlite3.connect(self.test_db))
+        try:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        finally:
+            conn.close()
 
 if __name__ == '__main__':
     unittest.main()
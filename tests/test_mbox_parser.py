@@ -3,8 +3,14 @@ import sys
 import unittest
 import tempfile
 import mailbox
+import base64
+import email.header
+import email.message
+import email.parser
+import email.policy
 import sqlite3
 import shutil
+import logging
 from unittest.mock import patch, MagicMock, mock_open
 
 # Add the parent directory to the path so we can import modules
@@ -14,12 +20,17 @@ from mbox_parser import (
     parse_mbox_file, setup_attachment_dir, extract_email_details,
     has_required_fields, save_attachment, create_email_data,
     check_sensitive_content, sanitize_filename, check_attachment,
-    process_message_attachments
+    process_message_attachments, iter_mbox_emails, MappedMbox, parse_mbox_rows,
+    parse_address, create_email_row, setup_database_connection, iter_base64_blocks,
+    save_attachment_part, parse_email_details
 )
+from db_manager import close_all_connections, create_db, prepare_email_data
 
 class MockMessage:
     """Mock for mailbox.mboxMessage."""
     
+    __slots__ = ('headers', 'parts')
+    
     def __init__(self, headers=None, parts=None):
         self.headers = headers or {}
         self.parts = parts or []
@@ -32,10 +43,15 @@ class MockMessage:
     
     def walk(self):
         return self.parts
+    
+    def is_multipart(self):
+        return bool(self.parts)
 
 class MockPart:
     """Mock for email message parts."""
     
+    __slots__ = ('content_type', 'filename', 'disposition', 'payload')
+    
     def __init__(self, content_type='text/plain', filename=None, disposition=None, payload=None):
         self.content_type = content_type
         self.filename = filename
@@ -59,53 +75,8 @@ class MockPart:
     def get_payload(self, decode=False):
         return self.payload
 
-class TestMboxParser(unittest.TestCase):
-    """Tests for the MBOX parser module."""
-    
-    def setUp(self):
-        """Set up test environment."""
-        # Create temporary directory for testing
-        self.test_dir = tempfile.mkdtemp()
-        self.mbox_path = os.path.join(self.test_dir, 'test.mbox')
-        self.output_dir = os.path.join(self.test_dir, 'output')
-        self.db_path = os.path.join(self.test_dir, 'test.db')
-        
-        os.makedirs(self.output_dir, exist_ok=True)
-        
-        # Create a test database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS emails (
-            id INTEGER PRIMARY KEY,
-            subject TEXT,
-            sender_name TEXT,
-            sender_email TEXT,
-            recipient_name TEXT,
-            recipient_email TEXT,
-            attachment_filename TEXT,
-            attachment_type TEXT,
-            email_date TEXT,
-            source_pst TEXT
-        )
-        ''')
-        conn.commit()
-        conn.close()
-    
-    def tearDown(self):
-        """Clean up after tests."""
-        # Remove temporary directory
-        shutil.rmtree(self.test_dir)
-    
-    def test_setup_attachment_dir(self):
-        """Test the setup_attachment_dir function."""
-        # Call the function
-        save_dir = setup_attachment_dir(self.output_dir)
-        
-        # Verify the result
-        expected_dir = os.path.join(self.output_dir, 'attachments')
-        self.assertEqual(save_dir, expected_dir)
-        self.assertTrue(os.path.exists(expected_dir))
+class TestMboxParserHelpers(unittest.TestCase):
+    """Tests for the parser helpers that don't touch the filesystem."""
     
     def test_extract_email_details(self):
         """Test extracting email details from a message."""
@@ -128,6 +99,35 @@ class TestMboxParser(unittest.TestCase):
         self.assertEqual(receiver_email, 'receiver@example.com')
         self.assertEqual(date, '2023-01-01 12:00:00')
     
+    def test_parse_email_details_skips_check_when_info_disabled(self):
+        """Test that the subject is only scanned when INFO messages are logged."""
+        root_logger = logging.getLogger()
+        with patch('mbox_parser.check_sensitive_content', return_value=False) as mock_check:
+            with patch.object(root_logger, 'isEnabledFor', return_value=True):
+                parse_email_details('Password reset', 'a@example.com', 'b@example.com', '')
+            mock_check.assert_called_once_with('Password reset')
+            
+            mock_check.reset_mock()
+            with patch.object(root_logger, 'isEnabledFor', return_value=False):
+                parse_email_details('Password reset', 'a@example.com', 'b@example.com', '')
+            mock_check.assert_not_called()
+    
+    def test_parse_address(self):
+        """Test that parsed addresses are cached and Header values are parsed as text."""
+        self.assertEqual(parse_address('Sender Name <sender@example.com>'),
+                         ('Sender Name', 'sender@example.com'))
+        self.assertIs(parse_address('Sender Name <sender@example.com>'),
+                      parse_address('Sender Name <sender@example.com>'))
+        
+        # Non-ASCII headers come back from compat32 as unhashable Header objects
+        header = email.header.Header('Sender <sender@example.com>')
+        self.assertEqual(parse_address(header), ('Sender', 'sender@example.com'))
+        
+        # A comma inside a quoted display name doesn't split the address
+        self.assertEqual(parse_address('"Last, First" <first.last@example.com>'),
+                         ('Last, First', 'first.last@example.com'))
+        self.assertEqual(parse_address('sender@example.com'), ('', 'sender@example.com'))
+    
     def test_has_required_fields(self):
         """Test checking for required fields."""
         # Test with all fields present
@@ -138,33 +138,16 @@ class TestMboxParser(unittest.TestCase):
         self.assertFalse(has_required_fields('Subject', '', 'Receiver'))
         self.assertFalse(has_required_fields('Subject', 'Sender', ''))
     
-    def test_save_attachment(self):
-        """Test saving an attachment."""
-        # Create a test attachment
-        attachment_data = b'Test attachment content'
-        attachment_path = os.path.join(self.test_dir, 'attachment.txt')
-        
-        # Save the attachment
-        result = save_attachment(attachment_data, attachment_path)
-        
-        # Verify the result
-        self.assertTrue(result)
-        self.assertTrue(os.path.exists(attachment_path))
-        
-        # Check file content
-        with open(attachment_path, 'rb') as f:
-            content = f.read()
-            self.assertEqual(content, attachment_data)
-    
-    def test_save_attachment_error(self):
-        """Test handling errors when saving attachments."""
-        # Create test data
-        attachment_data = b'Test attachment content'
-        
-        # Test with IOError
-        with patch('builtins.open', side_effect=IOError("Test error")):
-            result = save_attachment(attachment_data, "invalid/path")
-            self.assertFalse(result)
+    def test_iter_base64_blocks(self):
+        """Test block-by-block decoding of well-formed and malformed base64."""
+        data = bytes(range(256)) * 40
+        encoded = base64.encodebytes(data).decode('ascii').replace('\n', '\r\n')
+        self.assertEqual(b''.join(iter_base64_blocks(encoded, block_size=100)), data)
+        
+        # Payloads the lenient decoder would have to repair are rejected
+        for malformed in ('QUJD!REVG', 'QUI=QUJD', 'QUJDRA'):
+            with self.assertRaises(ValueError):
+                b''.join(iter_base64_blocks(malformed, block_size=4))
     
     def test_create_email_data(self):
         """Test creating email data dictionary."""
@@ -185,10 +168,27 @@ class TestMboxParser(unittest.TestCase):
             'attachment_filename': 'test.txt',
             'attachment_type': 'text/plain',
             'email_date': '2023-01-01',
-            'source_pst': 'test.pst'
+            'source_pst': 'test.pst',
+            'new_email': True
         }
         self.assertEqual(email_data, expected)
     
+    def test_create_email_row(self):
+        """Test that row tuples match prepared email data dictionaries."""
+        args = ('Test Subject', 'Sender Name', 'sender@example.com',
+                'Receiver Name', 'receiver@example.com', '2023-01-01')
+        self.assertEqual(create_email_row(*args, 'test.txt', 'text/plain', 'test.pst'),
+                         prepare_email_data(create_email_data(*args, 'test.txt', 'text/plain', 'test.pst')))
+        self.assertEqual(create_email_row(*args, source_pst='test.pst'),
+                         prepare_email_data(create_email_data(*args, source_pst='test.pst')))
+        
+        # Header values and missing dates are stored as text
+        header = email.header.Header('Test Subject')
+        row = create_email_row(header, 'Sender Name', 'sender@example.com',
+                               'Receiver Name', 'receiver@example.com', None)
+        self.assertEqual(row[0], 'Test Subject')
+        self.assertEqual(row[7], '')
+    
     def test_check_sensitive_content(self):
         """Test checking for sensitive content."""
         # Test with sensitive content
@@ -196,9 +196,12 @@ class TestMboxParser(unittest.TestCase):
         self.assertTrue(check_sensitive_content("CONFIDENTIAL: secret data"))
         self.assertTrue(check_sensitive_content("SSN: 123-45-6789"))
         
+        self.assertTrue(check_sensitive_content("Card 4111 1111-1111 1111 on file"))
+        
         # Test with non-sensitive content
         self.assertFalse(check_sensitive_content("This is a normal message"))
         self.assertFalse(check_sensitive_content(""))
+        self.assertFalse(check_sensitive_content("Order 1123-45-67890 shipped"))
     
     def test_sanitize_filename(self):
         """Test sanitizing filenames."""
@@ -227,8 +230,376 @@ class TestMboxParser(unittest.TestCase):
         
         # Test with potentially problematic content type
         self.assertFalse(check_attachment('application/x-msdownload', b'Normal data'))
+
+class TestMboxParser(unittest.TestCase):
+    """Tests for the MBOX parser module."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        # Create temporary directory for testing
+        self.test_dir = tempfile.mkdtemp()
+        self.mbox_path = os.path.join(self.test_dir, 'test.mbox')
+        self.output_dir = os.path.join(self.test_dir, 'output')
+        self.db_path = os.path.join(self.test_dir, 'test.db')
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        # parse_mbox_file falls back to emaildb.sqlite3 in the working
+        # directory, so keep that database inside the temporary directory
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        # Drop cached connections, which may be mocks created under patch
+        close_all_connections()
+        
+        os.chdir(self.original_cwd)
+        
+        # Remove temporary directory
+        shutil.rmtree(self.test_dir)
+    
+    def test_setup_attachment_dir(self):
+        """Test the setup_attachment_dir function."""
+        # Call the function
+        save_dir = setup_attachment_dir(self.output_dir)
+        
+        # Verify the result
+        expected_dir = os.path.join(self.output_dir, 'attachments')
+        self.assertEqual(save_dir, expected_dir)
+        self.assertTrue(os.path.exists(expected_dir))
+        
+        # Later calls for the same directory don't touch the filesystem
+        with patch('os.makedirs') as mock_makedirs:
+            self.assertEqual(setup_attachment_dir(self.output_dir), expected_dir)
+        mock_makedirs.assert_not_called()
+        
+        # A directory removed during the run is created again on the next save
+        shutil.rmtree(expected_dir)
+        attachment_path = os.path.join(expected_dir, 'report.txt')
+        with patch.dict('mbox_parser._SAVED_ATTACHMENTS', clear=True):
+            self.assertEqual(save_attachment(b'report', attachment_path), attachment_path)
+        with open(attachment_path, 'rb') as f:
+            self.assertEqual(f.read(), b'report')
+    
+    def test_setup_database_connection(self):
+        """Test that the connection is opened on a created, WAL-mode database."""
+        db_path = os.path.join(self.test_dir, 'setup.sqlite3')
+        connection, should_close = setup_database_connection(db_path)
+        try:
+            self.assertTrue(should_close)
+            self.assertIsNone(connection.isolation_level)
+            self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM emails").fetchone()[0], 0)
+        finally:
+            connection.close()
+    
+    def test_save_attachment(self):
+        """Test saving an attachment."""
+        # Create a test attachment
+        attachment_data = b'Test attachment content'
+        attachment_path = os.path.join(self.test_dir, 'attachment.txt')
+        
+        # Save the attachment
+        result = save_attachment(attachment_data, attachment_path)
+        
+        # Verify the result
+        self.assertTrue(result)
+        self.assertTrue(os.path.exists(attachment_path))
+        
+        # Check file content
+        with open(attachment_path, 'rb') as f:
+            content = f.read()
+            self.assertEqual(content, attachment_data)
+    
+    def test_save_attachment_partial_writes(self):
+        """Test that short writes are resumed until all the data is written."""
+        attachment_path = os.path.join(self.test_dir, 'attachment.bin')
+        real_write = os.write
+        
+        with patch('mbox_parser.os.write', side_effect=lambda fd, data: real_write(fd, data[:3])):
+            self.assertTrue(save_attachment(b'0123456789', attachment_path))
+        with open(attachment_path, 'rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+    
+    def test_save_attachment_skips_repeated_content(self):
+        """Test that the same content is written to a path only once."""
+        attachment_path = os.path.join(self.test_dir, 'image001.png')
+        self.assertEqual(save_attachment(b'logo', attachment_path), attachment_path)
+        
+        with patch('mbox_parser.os.open') as mock_open_file:
+            self.assertEqual(save_attachment(b'logo', attachment_path), attachment_path)
+            mock_open_file.assert_not_called()
+        
+        # Different content under the same name gets a numbered name
+        other_path = os.path.join(self.test_dir, 'image001 (1).png')
+        self.assertEqual(save_attachment(b'other logo', attachment_path), other_path)
+        with open(attachment_path, 'rb') as f:
+            self.assertEqual(f.read(), b'logo')
+        with open(other_path, 'rb') as f:
+            self.assertEqual(f.read(), b'other logo')
+        
+        # A remembered attachment whose file has been removed is saved again
+        os.remove(other_path)
+        self.assertEqual(save_attachment(b'other logo', attachment_path), other_path)
+        with open(other_path, 'rb') as f:
+            self.assertEqual(f.read(), b'other logo')
+        
+        # A file already on disk with the same content is reused
+        with patch.dict('mbox_parser._SAVED_ATTACHMENTS', clear=True):
+            self.assertEqual(save_attachment(b'other logo', attachment_path), other_path)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'image001 (2).png')))
+    
+    @patch('mbox_parser.STREAM_DECODE_MIN_SIZE', 16)
+    def test_save_attachment_part_streams_large_base64(self):
+        """Test that large base64 parts are decoded straight into the file."""
+        data = b'%PDF' + bytes(range(256)) * 40
+        attachment_path = os.path.join(self.test_dir, 'report.pdf')
+        part = email.message.Message()
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.set_payload(base64.encodebytes(data).decode('ascii'))
+        
+        with patch.object(part, 'get_payload', wraps=part.get_payload) as mock_get_payload:
+            self.assertEqual(save_attachment_part(part, 'application/pdf', attachment_path), attachment_path)
+            mock_get_payload.assert_called_once_with()
+        with open(attachment_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        
+        # Malformed base64 falls back to the lenient decoder
+        part.set_payload('JVBE!' + base64.b64encode(b'%PDF-1.7 ' * 10).decode('ascii')[4:])
+        saved_path = save_attachment_part(part, 'application/pdf', attachment_path)
+        self.assertEqual(saved_path, os.path.join(self.test_dir, 'report (1).pdf'))
+        with open(saved_path, 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.7 ' * 10)
+        with open(attachment_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+    
+    def test_save_attachment_part_streams_repeated_attachment_once(self):
+        """Test that a repeated large attachment is only kept once."""
+        data = b'%PDF' + os.urandom(600 * 1024)
+        attachment_path = os.path.join(self.test_dir, 'big.pdf')
+        part = email.message.Message()
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.set_payload(base64.encodebytes(data).decode('ascii'))
+        
+        with patch.dict('mbox_parser._SAVED_ATTACHMENTS', clear=True):
+            with patch('mbox_parser.save_attachment') as mock_save:
+                saved_paths = [save_attachment_part(part, 'application/pdf', attachment_path)
+                               for _ in range(3)]
+            mock_save.assert_not_called()
+            
+            self.assertEqual(saved_paths, [attachment_path] * 3)
+            self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'big (1).pdf')))
+            self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'big (2).pdf')))
+            with open(attachment_path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            
+            # Once the saved file is removed, the next copy is kept
+            os.remove(attachment_path)
+            self.assertEqual(save_attachment_part(part, 'application/pdf', attachment_path), attachment_path)
+            with open(attachment_path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        
+        # A later run into the same directory reuses the identical file on disk
+        with patch.dict('mbox_parser._SAVED_ATTACHMENTS', clear=True):
+            self.assertEqual(save_attachment_part(part, 'application/pdf', attachment_path), attachment_path)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'big (1).pdf')))
+    
+    def test_save_attachment_error(self):
+        """Test handling errors when saving attachments."""
+        # Create test data
+        attachment_data = b'Test attachment content'
+        
+        # Test with IOError
+        with patch('mbox_parser.os.open', side_effect=IOError("Test error")):
+            result = save_attachment(attachment_data, "invalid/path")
+            self.assertFalse(result)
+    
+    def test_iter_mbox_emails_required_headers(self):
+        """Test that messages are kept or skipped on their raw headers."""
+        messages = [
+            # Bare addresses have no display name but are complete
+            MockMessage(headers={'subject': 'Bare', 'from': 'sender@example.com',
+                                 'to': 'receiver@example.com'}),
+            MockMessage(headers={'subject': 'No recipient', 'from': 'sender@example.com'})
+        ]
+        
+        with patch('mbox_parser.parse_address', wraps=parse_address) as mock_parse_address:
+            records = list(iter_mbox_emails(messages, self.output_dir))
+        
+        self.assertEqual([r['subject'] for r in records], ['Bare'])
+        self.assertEqual(records[0]['sender_email'], 'sender@example.com')
+        # The skipped message's addresses were never parsed
+        self.assertEqual(mock_parse_address.call_count, 2)
+        
+        # Non-ASCII subjects arrive as Header objects
+        self.assertTrue(check_sensitive_content(email.header.Header('Caf\xe9 password', 'utf-8')))
+    
+    def test_iter_mbox_emails_is_lazy(self):
+        """Test that email records are produced one message at a time."""
+        messages = [
+            MockMessage(headers={
+                'subject': f'Subject {i}',
+                'from': 'Sender Name <sender@example.com>',
+                'to': 'Receiver Name <receiver@example.com>',
+                'date': '2023-01-01 12:00:00'
+            })
+            for i in range(3)
+        ]
+        consumed = []
+        
+        def mailbox_iter():
+            for message in messages:
+                consumed.append(message)
+                yield message
+        
+        emails = iter_mbox_emails(mailbox_iter(), self.output_dir, 'test.pst')
+        
+        # Nothing is read until the first record is requested
+        self.assertEqual(consumed, [])
+        first = next(emails)
+        self.assertEqual(first['subject'], 'Subject 0')
+        self.assertEqual(first['source_pst'], 'test.pst')
+        self.assertEqual(len(consumed), 1)
+        
+        self.assertEqual(len(list(emails)), 2)
+    
+    def test_mapped_mbox_matches_mailbox_mbox(self):
+        """Test that the mmap scan finds the same messages as mailbox.mbox."""
+        mbox = mailbox.mbox(self.mbox_path)
+        for i in range(3):
+            message = mailbox.mboxMessage()
+            message['Subject'] = f'Message {i}'
+            message.set_payload('First line\n\nFrom the body, escaped on write\n' if i == 1 else 'Body')
+            mbox.add(message)
+        mbox.close()
+        
+        expected = mailbox.mbox(self.mbox_path)
+        mapped = MappedMbox(self.mbox_path)
+        try:
+            self.assertEqual(len(mapped), len(expected))
+            self.assertEqual(mapped._toc, expected._toc)
+            self.assertEqual([m['Subject'] for m in mapped], ['Message 0', 'Message 1', 'Message 2'])
+            
+            # Messages parsed from the mmap match those read by mailbox.mbox
+            for parsed, reference in zip(mapped, expected):
+                self.assertEqual(parsed.get_payload(), reference.get_payload())
+                self.assertEqual(parsed.get_unixfrom(), 'From ' + reference.get_from())
+        finally:
+            expected.close()
+            mapped.close()
+        
+        # Iterating before the table of contents exists scans the file once
+        # and leaves the same table of contents behind
+        streamed = MappedMbox(self.mbox_path)
+        try:
+            self.assertIsNone(streamed._toc)
+            with patch('mbox_parser.drop_cached_pages') as mock_drop:
+                self.assertEqual([m['Subject'] for m in streamed], ['Message 0', 'Message 1', 'Message 2'])
+            self.assertEqual(streamed._toc, mapped._toc)
+            
+            # Pages read during the pass are released afterwards
+            mock_drop.assert_called_once_with(streamed._file.fileno())
+        finally:
+            streamed.close()
+        
+        # An empty file is an empty mailbox
+        empty_path = os.path.join(self.test_dir, 'empty.mbox')
+        open(empty_path, 'wb').close()
+        empty = MappedMbox(empty_path)
+        self.assertEqual(len(empty), 0)
+        empty.close()
+    
+    def test_mapped_mbox_split_ranges(self):
+        """Test that byte ranges split on message boundaries cover every message once."""
+        mbox = mailbox.mbox(self.mbox_path)
+        for i in range(5):
+            message = mailbox.mboxMessage()
+            message['Subject'] = f'Message {i}'
+            message.set_payload('First line\n\nFrom the body, escaped on write\n' * i)
+            mbox.add(message)
+        mbox.close()
+        
+        mapped = MappedMbox(self.mbox_path)
+        try:
+            expected = [m.as_bytes() for m in mapped]
+            for parts in (1, 2, 3, 10):
+                ranges = mapped.split_ranges(parts)
+                self.assertLessEqual(len(ranges), min(parts, 5))
+                self.assertEqual(ranges[0][0], 0)
+                self.assertEqual(ranges[-1][1], os.path.getsize(self.mbox_path))
+                
+                messages = [m.as_bytes() for byte_range in ranges for m in mapped.iter_range(*byte_range)]
+                self.assertEqual(messages, expected)
+        finally:
+            mapped.close()
+    
+    def test_mapped_mbox_parses_like_bytes_parser(self):
+        """Test that header-first parsing gives the same messages as a full parse."""
+        attachment = email.message.EmailMessage()
+        attachment['Subject'] = 'With attachment'
+        attachment.set_content('Body')
+        attachment.add_attachment(b'%PDF', maintype='application', subtype='pdf', filename='a.pdf')
+        samples = [
+            b'Subject: Plain\nTo: a@example.com\n\nFirst line\n\nSecond line\n',
+            b'Subject: Not a header below\nFrom nobody\n\nBody\n',
+            b'Subject: CRLF\r\n\r\nBody\r\n\n',
+            b'\nBody without headers\n',
+            attachment.as_bytes()
+        ]
+        parser = email.parser.BytesParser(policy=email.policy.compat32)
+        mbox = MappedMbox(self.mbox_path)
+        try:
+            for sample in samples:
+                expected = parser.parsebytes(sample)
+                parsed = mbox._parse_message(parser, sample)
+                self.assertEqual(parsed.as_bytes(), expected.as_bytes())
+                self.assertEqual([part.get_filename() for part in parsed.walk()],
+                                 [part.get_filename() for part in expected.walk()])
+        finally:
+            mbox.close()
+    
+    def test_parse_mbox_rows(self):
+        """Test parsing an MBOX file into prepared rows without a database."""
+        mbox = mailbox.mbox(self.mbox_path)
+        message = mailbox.mboxMessage()
+        message['Subject'] = 'Row Subject'
+        message['From'] = 'Sender Name <sender@example.com>'
+        message['To'] = 'Receiver Name <receiver@example.com>'
+        message['Date'] = '2023-01-01 12:00:00'
+        message.set_payload('Body')
+        mbox.add(message)
+        mbox.close()
+        
+        rows = parse_mbox_rows(self.mbox_path, self.output_dir, 'test.pst')
+        
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], 'Row Subject')
+        self.assertEqual(rows[0][2], 'sender@example.com')
+        self.assertEqual(rows[0][8], 'test.pst')
+        self.assertTrue(rows[0][-1])
+    
+    @patch('mbox_parser.MappedMbox')
+    def test_parse_mbox_file_streaming(self, mock_mbox):
+        """Test parsing without keeping the email details in memory."""
+        message = MockMessage(headers={
+            'subject': 'Test Subject',
+            'from': 'Sender Name <sender@example.com>',
+            'to': 'Receiver Name <receiver@example.com>',
+            'date': '2023-01-01 12:00:00'
+        })
+        mock_mbox.return_value = [message, message]
+        
+        create_db(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        result = parse_mbox_file(self.mbox_path, self.output_dir, conn, 'test.pst', keep_data=False)
+        
+        # Nothing is returned, but every record is stored
+        self.assertEqual(result, [])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0], 2)
+        conn.close()
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_empty(self, mock_mbox):
         """Test parsing an empty MBOX file."""
         # Mock an empty mailbox
@@ -240,7 +611,7 @@ class TestMboxParser(unittest.TestCase):
         # Should return an empty list
         self.assertEqual(result, [])
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_no_attachments(self, mock_mbox):
         """Test parsing a mailbox with messages but no attachments."""
         # Create a message without attachments
@@ -255,12 +626,7 @@ class TestMboxParser(unittest.TestCase):
         mock_mbox.return_value = [message]
         
         # Parse the mailbox
-        with patch('sqlite3.connect') as mock_connect:
-            mock_cursor = MagicMock()
-            mock_connection = MagicMock()
-            mock_connection.cursor.return_value = mock_cursor
-            mock_connect.return_value = mock_connection
-            
+        with patch('sqlite3.connect'):
             result = parse_mbox_file(self.mbox_path, self.output_dir)
         
         # Should have one message in the result
@@ -275,7 +641,7 @@ class TestMboxParser(unittest.TestCase):
         self.assertEqual(result[0]['email_date'], '2023-01-01 12:00:00')
         self.assertEqual(result[0]['attachment_filename'], '')  # No attachment
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_with_attachments(self, mock_mbox):
         """Test parsing a mailbox with messages that have attachments."""
         # Create a message with an attachment
@@ -297,18 +663,16 @@ class TestMboxParser(unittest.TestCase):
         )
         
         # Mock the mailbox with one message
-        mock_mailbox = MagicMock()
-        mock_mailbox.__iter__.return_value = [message]
-        mock_mailbox.__len__.return_value = 1
-        mock_mbox.return_value = mock_mailbox
+        mock_mbox.return_value = [message]
         
         # Set up the test environment
         os.makedirs(os.path.join(self.output_dir, 'attachments'), exist_ok=True)
         
-        # Mock the store_data function to prevent database operations
-        with patch('mbox_parser.store_data', return_value=True) as mock_store_data:
-            # Mock save_attachment to return True
-            with patch('mbox_parser.save_attachment', return_value=True) as mock_save:
+        # Mock the batch insert to prevent database operations
+        with patch('mbox_parser.insert_email_rows', return_value=1) as mock_insert_rows:
+            # Mock save_attachment to report the saved path
+            with patch('mbox_parser.save_attachment',
+                       return_value=os.path.join(self.output_dir, 'attachments', 'test.txt')) as mock_save:
                 # Mock file opening
                 with patch('builtins.open', mock_open()) as mock_file:
                     # Parse the mailbox
@@ -317,8 +681,9 @@ class TestMboxParser(unittest.TestCase):
                 # Verify save_attachment was called
                 mock_save.assert_called_once()
             
-            # Verify store_data was called twice (once for the attachment info)
-            mock_store_data.assert_called_once()
+            # Verify the rows were inserted in a single batch
+            mock_insert_rows.assert_called_once()
+            self.assertEqual(list(mock_insert_rows.call_args[0][1]), result)
         
         # Should have one message in the result
         self.assertEqual(len(result), 1)
@@ -328,7 +693,72 @@ class TestMboxParser(unittest.TestCase):
         self.assertEqual(result[0]['attachment_filename'], 'test.txt')
         self.assertEqual(result[0]['attachment_type'], 'text/plain')
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
+    def test_parse_mbox_file_without_extracting_attachments(self, mock_mbox):
+        """Test that attachments can be recorded without decoding or saving them."""
+        message = MockMessage(
+            headers={
+                'subject': 'Test Subject with Attachment',
+                'from': 'Sender Name <sender@example.com>',
+                'to': 'Receiver Name <receiver@example.com>',
+                'date': '2023-01-01 12:00:00'
+            },
+            parts=[
+                MockPart(
+                    content_type='application/pdf',
+                    filename='report.pdf',
+                    disposition='attachment; filename="report.pdf"',
+                    payload=b'%PDF-1.7'
+                )
+            ]
+        )
+        mock_mbox.return_value = [message]
+        
+        with patch('mbox_parser.save_attachment_part') as mock_save_part:
+            result = parse_mbox_file(self.mbox_path, self.output_dir, extract_attachments=False)
+        
+        mock_save_part.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'attachments')))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['attachment_filename'], 'report.pdf')
+        self.assertEqual(result[0]['attachment_type'], 'application/pdf')
+    
+    @patch('mbox_parser.MappedMbox')
+    def test_parse_mbox_file_groups_attachments_by_message(self, mock_mbox):
+        """Test that attachments are grouped by message, not by matching headers."""
+        headers = {
+            'subject': 'Same Subject',
+            'from': 'Sender Name <sender@example.com>',
+            'to': 'Receiver Name <receiver@example.com>',
+            'date': '2023-01-01 12:00:00'
+        }
+        
+        def attachment(name):
+            return MockPart(content_type='application/pdf', filename=name,
+                            disposition=f'attachment; filename="{name}"', payload=b'%PDF-1.7')
+        
+        # Two identical messages with one attachment each, then one with three
+        mock_mbox.return_value = [
+            MockMessage(headers=headers, parts=[attachment('a.pdf')]),
+            MockMessage(headers=headers, parts=[attachment('a.pdf')]),
+            MockMessage(headers=headers, parts=[attachment(name) for name in ('b.pdf', 'c.pdf', 'd.pdf')])
+        ]
+        
+        result = parse_mbox_file(self.mbox_path, self.output_dir, keep_data=False,
+                                 extract_attachments=False)
+        self.assertEqual(result, [])
+        
+        conn = sqlite3.connect(os.path.join(self.test_dir, 'emaildb.sqlite3'))
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0], 3)
+            self.assertEqual(
+                conn.execute("SELECT email_id, filename FROM attachments ORDER BY id").fetchall(),
+                [(1, 'a.pdf'), (2, 'a.pdf'), (3, 'b.pdf'), (3, 'c.pdf'), (3, 'd.pdf')]
+            )
+        finally:
+            conn.close()
+    
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_attachment_error(self, mock_mbox):
         """Test handling errors when saving attachments."""
         # Create a message with an attachment
@@ -350,24 +780,18 @@ class TestMboxParser(unittest.TestCase):
         )
         
         # Mock the mailbox with one message
-        mock_mailbox = MagicMock()
-        mock_mailbox.__iter__.return_value = [message]
-        mock_mailbox.__len__.return_value = 1
-        mock_mbox.return_value = mock_mailbox
+        mock_mbox.return_value = [message]
         
         # Mock save_attachment to fail
-        with patch('mbox_parser.save_attachment', return_value=False):
-            with patch('sqlite3.connect') as mock_connect:
-                mock_connection = MagicMock()
-                mock_connect.return_value = mock_connection
-                
+        with patch('mbox_parser.save_attachment', return_value=None):
+            with patch('sqlite3.connect'):
                 # Parse the mailbox
                 result = parse_mbox_file(self.mbox_path, self.output_dir)
         
         # Should not have any message in the result (since attachment failed)
         self.assertEqual(len(result), 0)
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_missing_fields(self, mock_mbox):
         """Test parsing a message with missing fields."""
         # Create a message with missing fields
@@ -382,18 +806,13 @@ class TestMboxParser(unittest.TestCase):
         mock_mbox.return_value = [message]
         
         # Parse the mailbox
-        with patch('sqlite3.connect') as mock_connect:
-            mock_cursor = MagicMock()
-            mock_connection = MagicMock()
-            mock_connection.cursor.return_value = mock_cursor
-            mock_connect.return_value = mock_connection
-            
+        with patch('sqlite3.connect'):
             result = parse_mbox_file(self.mbox_path, self.output_dir)
         
         # Should not have any message in the result (due to missing fields)
         self.assertEqual(len(result), 0)
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_db_error(self, mock_mbox):
         """Test handling database errors during parsing."""
         # Create a message
@@ -407,11 +826,10 @@ class TestMboxParser(unittest.TestCase):
         # Mock the mailbox with one message
         mock_mbox.return_value = [message]
         
-        # Mock store_data to raise an exception
-        with patch('mbox_parser.store_data', side_effect=Exception("Test exception")):
+        # Mock the batch insert to raise an exception
+        with patch('mbox_parser.insert_email_rows', side_effect=sqlite3.Error("Test exception")):
             with patch('sqlite3.connect') as mock_connect:
-                mock_connection = MagicMock()
-                mock_connect.return_value = mock_connection
+                mock_connection = mock_connect.return_value
                 
                 # Parse the mailbox should raise the exception
                 with self.assertRaises(Exception):
@@ -420,7 +838,7 @@ class TestMboxParser(unittest.TestCase):
                 # Verify rollback was called
                 mock_connection.rollback.assert_called_once()
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_general_error(self, mock_mbox):
         """Test handling general errors during parsing."""
         # Make mailbox.mbox raise an exception
@@ -430,14 +848,14 @@ class TestMboxParser(unittest.TestCase):
         with self.assertRaises(Exception):
             parse_mbox_file(self.mbox_path, self.output_dir)
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     def test_parse_mbox_file_connection_closure(self, mock_mbox):
         """Test proper connection closure with provided connection."""
         # Mock an empty mailbox
         mock_mbox.return_value = []
         
         # Create a mock connection
-        mock_connection = MagicMock()
+        mock_connection = MagicMock(spec_set=sqlite3.Connection)
         
         # Parse with the provided connection
         parse_mbox_file(self.mbox_path, self.output_dir, mock_connection)
@@ -445,7 +863,7 @@ class TestMboxParser(unittest.TestCase):
         # Verify the connection was not closed (since it was provided)
         mock_connection.close.assert_not_called()
     
-    @patch('mailbox.mbox')
+    @patch('mbox_parser.MappedMbox')
     @patch('os.path.exists')
     @patch('os.makedirs')
     def test_parse_mbox_file_with_source_pst(self, mock_makedirs, mock_exists, mock_mbox):
@@ -472,79 +890,34 @@ class TestMboxParser(unittest.TestCase):
         )
         
         # Mock the mailbox with one message
-        mock_mailbox = MagicMock()
-        mock_mailbox.__iter__.return_value = [message]
-        mock_mailbox.__len__.return_value = 1
-        mock_mbox.return_value = mock_mailbox
+        mock_mbox.return_value = [message]
         
         # Set up the database connection
+        create_db(self.db_path)
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS emails (
-            id INTEGER PRIMARY KEY,
-            subject TEXT,
-            sender_name TEXT,
-            sender_email TEXT,
-            recipient_name TEXT,
-            recipient_email TEXT,
-            attachment_filename TEXT,
-            attachment_type TEXT,
-            email_date TEXT,
-            source_pst TEXT
-        )
-        ''')
-        conn.commit()
-        
-        # Mock save_attachment to return True and store_data to insert actual data
-        with patch('mbox_parser.save_attachment', return_value=True):
-            with patch('mbox_parser.store_data') as mock_store_data:
-                # Set up mock_store_data to call our helper method
-                mock_store_data.side_effect = lambda data, conn_arg: self._mock_store_data(data, conn if conn_arg == conn else conn_arg)
-                
-                # Parse the mailbox with source_pst
-                with patch('builtins.open', mock_open()) as mock_file:
-                    result = parse_mbox_file(self.mbox_path, self.output_dir, conn, source_pst='test.pst')
-                
-                # Should have one message in the result
-                self.assertEqual(len(result), 1)
-                
-                # Verify source_pst was included in the result
-                self.assertEqual(result[0]['source_pst'], 'test.pst')
-                
-                # Verify mock_store_data was called with the right data
-                called_data = mock_store_data.call_args[0][0]
-                self.assertEqual(called_data['source_pst'], 'test.pst')
-                
-                # Query the database to verify data was stored
-                cursor = conn.cursor()
-                cursor.execute("SELECT source_pst FROM emails")
-                row = cursor.fetchone()
-                self.assertIsNotNone(row, "No data was inserted into the database")
-                self.assertEqual(row[0], 'test.pst')
+        
+        # Mock save_attachment to report a saved path so the row is stored in the real database
+        with patch('mbox_parser.save_attachment',
+                   return_value=os.path.join(self.output_dir, 'attachments', 'test.txt')):
+            # Parse the mailbox with source_pst
+            with patch('builtins.open', mock_open()) as mock_file:
+                result = parse_mbox_file(self.mbox_path, self.output_dir, conn, source_pst='test.pst')
+            
+            # Should have one message in the result
+            self.assertEqual(len(result), 1)
+            
+            # Verify source_pst was included in the result
+            self.assertEqual(result[0]['source_pst'], 'test.pst')
+            
+            # Query the database to verify data was stored
+            cursor = conn.cursor()
+            cursor.execute("SELECT source_pst FROM emails")
+            row = cursor.fetchone()
+            self.assertIsNotNone(row, "No data was inserted into the database")
+            self.assertEqual(row[0], 'test.pst')
         
         # Clean up
         conn.close()
-    
-    def _mock_store_data(self, data, db_connection):
-        """Helper method to mock store_data by actually inserting data."""
-        cursor = db_connection.cursor()
-        cursor.execute('''
-        INSERT INTO emails (subject, sender_name, sender_email, recipient_name, recipient_email, attachment_filename, attachment_type, email_date, source_pst)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['subject'],
-            data['sender_name'],
-            data['sender_email'],
-            data['recipient_name'],
-            data['recipient_email'],
-            data['attachment_filename'],
-            data['attachment_type'],
-            data['email_date'],
-            data['source_pst']
-        ))
-        db_connection.commit()
-        return True
 
 if __name__ == '__main__':
     unittest.main()